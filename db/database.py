@@ -1,45 +1,198 @@
 """
 Database configuration and session management.
 Uses async SQLAlchemy with SQLite.
+
+SQLite allows a single writer but many concurrent readers under WAL, so two
+engines are configured: a one-connection write engine and a read-only pool
+for GET endpoints, keeping status polls off the write connection.
 """
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+import asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncConnection, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, MappedAsDataclass
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 DATABASE_URL = "sqlite+aiosqlite:///./app.db"
 
-# Create async engine
-engine = create_async_engine(
+# Applied to every new SQLite connection (PRAGMAs are per-connection state).
+# WAL lets readers proceed while a writer commits, and synchronous=NORMAL is
+# durable under WAL while skipping the second fsync per commit.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA busy_timeout=30000;",  # wait out a long analysis commit rather than 5xx
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA cache_size=-64000;",  # ~64 MB page cache
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA foreign_keys=ON;",
+)
+
+# Compiled-statement LRU per engine (SQLAlchemy default is 500). The app
+# issues a small, fixed set of statements, so everything stays compiled.
+QUERY_CACHE_SIZE = 1024
+
+# Write engine: SQLite serializes writers anyway, so a single pooled
+# connection avoids SQLITE_BUSY between our own writers. IMMEDIATE makes the
+# driver open write transactions with BEGIN IMMEDIATE, taking the write lock
+# up front instead of failing on lock upgrade mid-transaction.
+write_engine = create_async_engine(
     DATABASE_URL,
     echo=False,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False, "isolation_level": "IMMEDIATE"},
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=1,
+    max_overflow=0,
+    pool_recycle=3600,
+    query_cache_size=QUERY_CACHE_SIZE
 )
 
-# Create async session factory
+# Read engine: one connection per CPU, opened query-only.
+read_engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    connect_args={"check_same_thread": False},
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=os.cpu_count() or 4,
+    max_overflow=0,
+    pool_recycle=3600,
+    query_cache_size=QUERY_CACHE_SIZE
+)
+
+# Default engine for schema management and migrations
+engine = write_engine
+
+
+def _apply_pragmas(dbapi_connection, pragmas) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in pragmas:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+@event.listens_for(write_engine.sync_engine, "connect")
+def _set_write_pragmas(dbapi_connection, connection_record):
+    """Tune each new write connection as it is opened."""
+    _apply_pragmas(dbapi_connection, SQLITE_PRAGMAS)
+
+
+@event.listens_for(write_engine.sync_engine, "close")
+def _optimize_on_close(dbapi_connection, connection_record):
+    """Let SQLite refresh planner statistics it found stale before closing."""
+    try:
+        _apply_pragmas(dbapi_connection, ("PRAGMA optimize;",))
+    except Exception:
+        pass  # never block a connection close on housekeeping
+
+
+@event.listens_for(read_engine.sync_engine, "connect")
+def _set_read_pragmas(dbapi_connection, connection_record):
+    """Tune each new read connection and make it reject writes."""
+    _apply_pragmas(dbapi_connection, SQLITE_PRAGMAS + ("PRAGMA query_only=ON;",))
+
+
+# Create async session factories
 async_session_maker = async_sessionmaker(
-    engine,
+    write_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+read_session_maker = async_sessionmaker(
+    read_engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
-Base = declarative_base()
+class Base(MappedAsDataclass, DeclarativeBase, kw_only=True):
+    """
+    Declarative base for all models.
+
+    Models are dataclasses with a generated keyword-only __init__. Eager
+    defaults fetch server-generated values (e.g. created_at) via RETURNING
+    on the INSERT/UPDATE itself instead of a follow-up SELECT on access.
+    """
+    __mapper_args__ = {"eager_defaults": True}
 
 
-async def get_db() -> AsyncSession:
-    """Dependency for getting database sessions."""
+async def get_db_rw() -> AsyncSession:
+    """Dependency for getting read-write database sessions."""
     async with async_session_maker() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+        yield session
+
+
+async def get_db_ro() -> AsyncSession:
+    """Dependency for getting read-only database sessions."""
+    async with read_session_maker() as session:
+        yield session
+
+
+async def get_conn_ro() -> AsyncConnection:
+    """
+    Dependency for read-only Core connections.
+    For single-SELECT endpoints that need no identity map or unit of work.
+    """
+    async with read_engine.connect() as conn:
+        yield conn
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    """create_all skips existing tables, so add indexes introduced later."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
 
 
 async def init_db():
-    """Initialize database and enable foreign keys."""
-    async with engine.begin() as conn:
-        # Enable foreign keys for SQLite
-        await conn.exec_driver_sql("PRAGMA foreign_keys = ON;")
+    """Initialize database (connection PRAGMAs are applied on connect)."""
+    async with write_engine.begin() as conn:
         # Create all tables
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        
+        # Rebuild tables created by older versions before adding new indexes
+        from db.migration import upgrade_schema
+        await conn.run_sync(upgrade_schema)
+        await conn.run_sync(_create_missing_indexes)
+        
+        # Planner statistics so the composite indexes are chosen over scans
+        await conn.exec_driver_sql("ANALYZE;")
+
+
+# Long-running processes rarely close the write connection, so statistics
+# are also refreshed on a timer
+OPTIMIZE_INTERVAL_SECONDS = 24 * 60 * 60
+
+
+async def optimize_db() -> None:
+    """Run PRAGMA optimize on the write connection."""
+    async with write_engine.begin() as conn:
+        await conn.exec_driver_sql("PRAGMA optimize;")
+
+
+async def periodic_optimize(interval: float = OPTIMIZE_INTERVAL_SECONDS) -> None:
+    """Background loop for optimize_db; runs until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await optimize_db()
+        except Exception as e:
+            logger.warning("PRAGMA optimize failed", error=str(e))
+
+
+async def close_db() -> None:
+    """Close pooled connections (the write connection optimizes on close)."""
+    await write_engine.dispose()
+    await read_engine.dispose()
+
+
+def get_pool_status() -> dict:
+    """Describe the connection pool state (size, checked in/out, overflow)."""
+    return {
+        "write": write_engine.pool.status(),
+        "read": read_engine.pool.status()
+    }
@@ -3,76 +3,202 @@ Database migration helper for V2 schema.
 Adds new analysis_results table while preserving old tables for backward compatibility.
 """
 from sqlalchemy import text
-from db.database import engine
+from db.database import engine, Base
+
+# Child tables whose TEXT UUID primary key became an INTEGER rowid alias
+INTEGER_ID_TABLES = (
+    "tech_stack",
+    "architecture_components",
+    "key_files",
+    "setup_steps",
+    "contribution_areas",
+    "risky_areas",
+    "known_issues",
+)
+
+# Nullable columns added to existing tables after their first release
+ADDED_COLUMNS = (
+    ("repositories", "content_fingerprint"),
+)
+
+
+def _create_analysis_results(sync_conn) -> bool:
+    """Create analysis_results and its indexes from the model; True if the table was new."""
+    table = Base.metadata.tables["analysis_results"]
+    created = not sync_conn.dialect.has_table(sync_conn, table.name)
+    table.create(sync_conn, checkfirst=True)
+    for index in table.indexes:
+        index.create(sync_conn, checkfirst=True)
+    return created
 
 
 async def migrate_to_v2():
     """
     Create new analysis_results table.
     Old tables remain for backward compatibility but are deprecated.
+    
+    DDL (table plus idx_analysis_confidence / idx_analysis_language) comes
+    from the AnalysisResultV2 model, the same objects create_all uses at
+    init_db time.
     """
+    import models.schemas  # noqa: F401  (registers tables on Base.metadata)
+    
     async with engine.begin() as conn:
-        # Enable foreign keys
-        await conn.exec_driver_sql("PRAGMA foreign_keys = ON;")
+        created = await conn.run_sync(_create_analysis_results)
         
-        # Check if new table exists
-        result = await conn.execute(text(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='analysis_results';"
-        ))
-        exists = result.scalar() is not None
-        
-        if not exists:
-            print("Creating analysis_results table...")
-            
-            await conn.execute(text("""
-                CREATE TABLE analysis_results (
-                    repo_id TEXT PRIMARY KEY,
-                    summary TEXT NOT NULL,
-                    purpose TEXT NOT NULL,
-                    primary_language TEXT NOT NULL,
-                    architecture_pattern TEXT NOT NULL,
-                    confidence_score REAL DEFAULT 0.8,
-                    tech_stack_json TEXT NOT NULL,
-                    components_json TEXT NOT NULL,
-                    key_files_json TEXT NOT NULL,
-                    setup_steps_json TEXT NOT NULL,
-                    contribution_areas_json TEXT NOT NULL,
-                    risky_areas_json TEXT NOT NULL,
-                    known_issues_json TEXT NOT NULL,
-                    data_flow TEXT NOT NULL,
-                    raw_llm_response TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    analysis_version TEXT DEFAULT '2.0',
-                    FOREIGN KEY (repo_id) REFERENCES repositories(id)
-                );
-            """))
-            
+        if created:
             print("✓ analysis_results table created")
         else:
             print("✓ analysis_results table already exists")
         
-        # Create index for faster queries
-        await conn.execute(text(
-            "CREATE INDEX IF NOT EXISTS idx_analysis_confidence ON analysis_results(confidence_score);"
-        ))
-        await conn.execute(text(
-            "CREATE INDEX IF NOT EXISTS idx_analysis_language ON analysis_results(primary_language);"
-        ))
-        
         print("✓ Migration complete")
 
 
+def _replace_table(sync_conn, table_name: str) -> str:
+    """
+    Move a table aside and create it afresh from the model.
+    Returns the name of the old table, which the caller copies from and drops.
+    """
+    old_name = f"{table_name}_old"
+    sync_conn.execute(text(f"ALTER TABLE {table_name} RENAME TO {old_name};"))
+    
+    # Renamed tables keep their index names; drop them so create() can reuse them
+    index_names = sync_conn.execute(text(
+        "SELECT name FROM sqlite_master "
+        "WHERE type='index' AND tbl_name=:tbl AND sql IS NOT NULL;"
+    ), {"tbl": old_name}).scalars().all()
+    for index_name in index_names:
+        sync_conn.execute(text(f"DROP INDEX {index_name};"))
+    
+    Base.metadata.tables[table_name].create(sync_conn)
+    return old_name
+
+
+def _rebuild_with_integer_id(sync_conn, table_name: str) -> bool:
+    """Rebuild one child table with an INTEGER id, keeping every other column."""
+    columns = sync_conn.execute(text(f"PRAGMA table_info({table_name});")).all()
+    if not columns:
+        return False
+    id_type = next((col.type for col in columns if col.name == "id"), None)
+    if id_type is None or id_type.upper() == "INTEGER":
+        return False
+    
+    old_name = _replace_table(sync_conn, table_name)
+    
+    table = Base.metadata.tables[table_name]
+    copy_columns = ", ".join(col.name for col in table.columns if col.name != "id")
+    sync_conn.execute(text(
+        f"INSERT INTO {table_name} ({copy_columns}) "
+        f"SELECT {copy_columns} FROM {old_name} ORDER BY rowid;"
+    ))
+    sync_conn.execute(text(f"DROP TABLE {old_name};"))
+    return True
+
+
+async def migrate_child_ids_to_integer():
+    """
+    One-shot migration of child-table ids from TEXT UUIDs to INTEGER rowids.
+    Safe to re-run: tables that already use INTEGER ids are skipped.
+    """
+    import models.schemas  # noqa: F401  (registers tables on Base.metadata)
+    
+    async with engine.begin() as conn:
+        for table_name in INTEGER_ID_TABLES:
+            rebuilt = await conn.run_sync(_rebuild_with_integer_id, table_name)
+            if rebuilt:
+                print(f"✓ {table_name} migrated to INTEGER ids")
+        
+        print("✓ Child id migration complete")
+
+
+def _rebuild_qa_logs_with_hash(sync_conn) -> bool:
+    """
+    Rebuild qa_logs with question_hash (and an INTEGER id).
+    Only the newest answer per (repo_id, normalized question) is kept.
+    """
+    from models.schemas import QALog
+    
+    columns = sync_conn.execute(text("PRAGMA table_info(qa_logs);")).all()
+    if not columns or any(col.name == "question_hash" for col in columns):
+        return False
+    
+    old_name = _replace_table(sync_conn, "qa_logs")
+    
+    rows = sync_conn.execute(text(
+        f"SELECT repo_id, question, answer, created_at FROM {old_name} "
+        "ORDER BY created_at DESC, rowid DESC;"
+    )).all()
+    if rows:
+        # Newest first, so OR IGNORE drops the older duplicates
+        sync_conn.execute(text(
+            "INSERT OR IGNORE INTO qa_logs "
+            "(repo_id, question, question_hash, answer, created_at) "
+            "VALUES (:repo_id, :question, :question_hash, :answer, :created_at);"
+        ), [
+            {
+                "repo_id": row.repo_id,
+                "question": row.question,
+                "question_hash": QALog.hash_question(row.question),
+                "answer": row.answer,
+                "created_at": row.created_at
+            }
+            for row in rows
+        ])
+    sync_conn.execute(text(f"DROP TABLE {old_name};"))
+    return True
+
+
+async def migrate_qa_question_hash():
+    """
+    One-shot migration adding qa_logs.question_hash and its unique
+    (repo_id, question_hash) index. Safe to re-run.
+    """
+    import models.schemas  # noqa: F401  (registers tables on Base.metadata)
+    
+    async with engine.begin() as conn:
+        rebuilt = await conn.run_sync(_rebuild_qa_logs_with_hash)
+        if rebuilt:
+            print("✓ qa_logs migrated to question_hash")
+        
+        print("✓ Q&A hash migration complete")
+
+
+def _add_missing_columns(sync_conn) -> None:
+    """ALTER TABLE ... ADD COLUMN for each ADDED_COLUMNS entry the table lacks."""
+    for table_name, column_name in ADDED_COLUMNS:
+        existing = {
+            col.name
+            for col in sync_conn.execute(text(f"PRAGMA table_info({table_name});"))
+        }
+        if existing and column_name not in existing:
+            column = Base.metadata.tables[table_name].columns[column_name]
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(
+                f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type};"
+            ))
+
+
+def upgrade_schema(sync_conn) -> None:
+    """Apply the table changes above in place; a no-op on an up-to-date database."""
+    for table_name in INTEGER_ID_TABLES:
+        _rebuild_with_integer_id(sync_conn, table_name)
+    _rebuild_qa_logs_with_hash(sync_conn)
+    _add_missing_columns(sync_conn)
+
+
 async def check_schema_version():
     """Check which schema version is in use."""
     async with engine.begin() as conn:
+        # Aggregate in SQLite so a single row comes back
         result = await conn.execute(text(
-            "SELECT name FROM sqlite_master WHERE type='table';"
+            "SELECT MAX(name = 'analysis_results') AS v2, "
+            "SUM(name IN ('tech_stack', 'architecture_summary')) = 2 AS v1 "
+            "FROM sqlite_master WHERE type='table';"
         ))
-        tables = [row[0] for row in result.fetchall()]
+        row = result.first()
         
-        has_v2 = 'analysis_results' in tables
-        has_v1 = 'tech_stack' in tables and 'architecture_summary' in tables
+        has_v2 = bool(row.v2)
+        has_v1 = bool(row.v1)
         
         if has_v2:
             print("✓ Schema V2 detected (unified analysis_results)")
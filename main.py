@@ -10,73 +10,82 @@ Features:
 - Structured logging
 """
 import os
+import re
+import asyncio
+import hashlib
 from contextlib import asynccontextmanager
+from pathlib import Path
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from dotenv import load_dotenv
+
+# Load environment variables before importing app modules: services are
+# constructed (and read their keys) when routes.api is imported. An explicit
+# path skips find_dotenv's directory walk; real env vars take precedence.
+load_dotenv(Path(__file__).parent / ".env", override=False)
+
 from slowapi.errors import RateLimitExceeded
 
-from db.database import init_db
-from routes.api import router
+from db.database import init_db, close_db, periodic_optimize
+from routes.api import router, analysis_service
 from utils.rate_limiter import get_limiter
 from utils.logger import get_logger
 
-# Load environment variables
-load_dotenv()
-
 # Initialize logger
 logger = get_logger(__name__)
 
+INDEX_HTML_PATH = Path(__file__).parent / "index.html"
+
+# Paths the SPA catch-all must not answer: the API prefix and anything
+# whose last segment has a file extension (static assets)
+_IS_NON_SPA = re.compile(r"^api(/|$)|\.[^./]+$").search
+
+
+def _load_index_html(app: FastAPI) -> None:
+    """Read index.html once so SPA routes are served from memory."""
+    if INDEX_HTML_PATH.exists():
+        content = INDEX_HTML_PATH.read_bytes()
+        app.state.index_html = content
+        app.state.index_etag = f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+    else:
+        app.state.index_html = None
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle manager with proper database initialization."""
     # Startup
-    print("=" * 80)
-    print("🚀 GitHub Repository Analyzer - Production")
-    print("=" * 80)
-    
-    print("\n📊 Initializing database...")
     await init_db()
-    print("✅ Database initialized successfully")
+    _load_index_html(app)
+    optimize_task = asyncio.create_task(periodic_optimize())
+    # Not awaited: startup does not wait on GitHub being reachable
+    warm_up_task = asyncio.create_task(analysis_service.github.warm_up())
     
-    # Print configuration
     api_key = os.getenv("GEMINI_API_KEY")
     model = os.getenv("GEMINI_MODEL", "flash")
-    
-    print("\n🤖 AI Configuration:")
     if api_key:
         model_name = "Gemini 3 Pro" if model.lower() == "pro" else "Gemini 3 Flash"
-        print(f"  ✅ {model_name} configured")
-        print(f"  ✅ API Key: {'*' * 20}{api_key[-8:]}")
     else:
-        print("  ⚠️  No GEMINI_API_KEY - using mock mode")
-        print("  💡 Set GEMINI_API_KEY in .env for AI analysis")
-    
-    print("\n⚡ Architecture:")
-    print("  ✅ Status-based async flow (Option A)")
-    print("  ✅ Split table storage (normalized)")
-    print("  ✅ Single Gemini call per repository")
-    print("  ✅ Zero Gemini calls in /api/ask")
-    print("  ✅ Proper SQLite persistence")
-    print("  ✅ Idempotent Q&A operations")
+        model_name = "mock"
     
-    print("\n🌐 Endpoints:")
-    print("  POST   /api/analyze-repo     - Start analysis")
-    print("  GET    /api/status/{id}      - Check status")
-    print("  GET    /api/analysis/{id}    - Get results")
-    print("  POST   /api/ask              - Ask questions")
-    print("  GET    /api/health           - Health check")
-    
-    print("\n" + "=" * 80)
-    print("✅ Application started successfully")
-    print("=" * 80 + "\n")
+    # Endpoints are documented by the OpenAPI schema at /docs
+    logger.info(
+        "Application started",
+        api_key_present=bool(api_key),
+        model=model_name,
+        index_html_loaded=app.state.index_html is not None
+    )
     
     yield
     
     # Shutdown
-    print("\n👋 Application shutting down...")
+    logger.info("Application shutting down")
+    optimize_task.cancel()
+    warm_up_task.cancel()
+    await analysis_service.github.aclose()
+    await close_db()
 
 
 # Create FastAPI app
@@ -84,7 +93,8 @@ app = FastAPI(
     title="GitHub Repository Analyzer - Production",
     description="Hardened system with proper async flow and guaranteed persistence",
     version="3.0.0-final",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add rate limiter
@@ -99,6 +109,10 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
         content={"detail": "Rate limit exceeded. Please try again later."}
     )
 
+# Compress larger responses (analysis JSON, index.html). Added before CORS
+# so CORS stays the outermost middleware; level 4 favours CPU over ratio.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=4)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -116,27 +130,38 @@ from routes.websocket import router as ws_router
 app.include_router(ws_router, tags=["websocket"])
 
 # Serve index.html at root and for SPA routing (all non-API routes)
+def _index_response(request: Request):
+    """In-memory index.html, or 304 when the client already has this version."""
+    content = getattr(request.app.state, "index_html", None)
+    if content is None:
+        return None
+    
+    etag = request.app.state.index_etag
+    headers = {"Cache-Control": "public, max-age=300", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="text/html", headers=headers)
+
+
 @app.get("/")
-async def serve_root():
+async def serve_root(request: Request):
     """Serve index.html at root."""
-    import os
-    index_path = os.path.join(os.path.dirname(__file__), "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path, media_type="text/html")
+    response = _index_response(request)
+    if response is not None:
+        return response
     return {"error": "index.html not found"}
 
 
 @app.get("/{path:path}")
-async def serve_spa(path: str):
+async def serve_spa(path: str, request: Request):
     """Serve index.html for SPA routing (catch-all for non-API, non-static routes)."""
     # Skip if it looks like an API call or static asset with extension
-    if path.startswith("api") or "." in path.split("/")[-1]:
+    if _IS_NON_SPA(path):
         return JSONResponse({"error": "Not found"}, status_code=404)
     
-    import os
-    index_path = os.path.join(os.path.dirname(__file__), "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path, media_type="text/html")
+    response = _index_response(request)
+    if response is not None:
+        return response
     return JSONResponse({"error": "index.html not found"}, status_code=404)
 
 
@@ -151,5 +176,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=port,
         reload=True,
-        log_level="info"
+        log_level="info",
+        # Protocol-level WebSocket keep-alive (see routes/websocket.py)
+        ws_ping_interval=20,
+        ws_ping_timeout=10
     )
\ No newline at end of file
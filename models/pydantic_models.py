@@ -1,40 +1,45 @@
 """
 Pydantic models for API request and response validation.
 """
-from pydantic import BaseModel, HttpUrl, Field
+from pydantic import BaseModel, ConfigDict, HttpUrl, Field
 from typing import Optional, List
 from datetime import datetime
 
 
-class AnalyzeRepoRequest(BaseModel):
+class APIModel(BaseModel):
+    """Base for API models: unknown fields ignored, instances immutable."""
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+
+class AnalyzeRepoRequest(APIModel):
     repo_url: str = Field(..., description="GitHub repository URL")
 
 
-class AnalyzeRepoResponse(BaseModel):
+class AnalyzeRepoResponse(APIModel):
     repo_id: str
     status: str
     message: str
 
 
-class AskQuestionRequest(BaseModel):
+class AskQuestionRequest(APIModel):
     repo_id: str
     question: str
 
 
-class AskQuestionResponse(BaseModel):
+class AskQuestionResponse(APIModel):
     repo_id: str
     question: str
     answer: str
     created_at: datetime
 
 
-class TechStackItem(BaseModel):
+class TechStackItem(APIModel):
     name: str
     category: str
     reasoning: str
 
 
-class RepositoryInfo(BaseModel):
+class RepositoryInfo(APIModel):
     id: str
     repo_url: str
     owner: Optional[str]
@@ -43,11 +48,11 @@ class RepositoryInfo(BaseModel):
     analyzed_at: Optional[datetime]
 
 
-class AnalysisResult(BaseModel):
+class AnalysisResult(APIModel):
     repository: RepositoryInfo
     overview: Optional[str]
     tech_stack: List[TechStackItem]
     architecture_overview: Optional[str]
     getting_started: Optional[str]
     safe_areas: Optional[str]
-    caution_areas: Optional[str]
\ No newline at end of file
+    caution_areas: Optional[str]
@@ -2,7 +2,12 @@
 Production V2 Database Models - Split Table Architecture
 Stores data in normalized tables for better queries and flexibility.
 """
-from sqlalchemy import Column, String, Text, ForeignKey, DateTime, Float, Integer
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Text, ForeignKey, DateTime, Float, Integer, LargeBinary, Index
+from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 from db.database import Base
 
@@ -14,25 +19,31 @@ from db.database import Base
 class Repository(Base):
     __tablename__ = "repositories"
     
-    id = Column(Text, primary_key=True)
-    repo_url = Column(Text, unique=True, nullable=False, index=True)
-    owner = Column(Text, nullable=False)
-    name = Column(Text, nullable=False)
-    primary_language = Column(Text)
-    created_at = Column(DateTime)
-    analyzed_at = Column(DateTime)
+    id: Mapped[str] = mapped_column(Text, primary_key=True)
+    repo_url: Mapped[str] = mapped_column(Text, unique=True, index=True)
+    owner: Mapped[str] = mapped_column(Text)
+    name: Mapped[str] = mapped_column(Text)
+    primary_language: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=None)
+    analyzed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=None)
+    # Repository state the stored analysis was made from (see execute_analysis)
+    content_fingerprint: Mapped[Optional[str]] = mapped_column(Text, default=None)
 
 
 class AnalysisSession(Base):
     __tablename__ = "analysis_sessions"
+    __table_args__ = (
+        # Latest session per repo: an index seek, read backwards for started_at DESC
+        Index("ix_sessions_repo_started", "repo_id", "started_at"),
+    )
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    status = Column(Text, nullable=False, index=True)  # processing|completed|failed
-    started_at = Column(DateTime, nullable=False)
-    completed_at = Column(DateTime)
-    error_message = Column(Text)
-    gemini_call_count = Column(Integer, default=0)  # Track API calls made
+    id: Mapped[str] = mapped_column(Text, primary_key=True)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"))
+    status: Mapped[str] = mapped_column(Text, index=True)  # processing|completed|failed
+    started_at: Mapped[datetime] = mapped_column(DateTime)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=None)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    gemini_call_count: Mapped[Optional[int]] = mapped_column(Integer, default=0)  # Track API calls made
     
 
 # ============================================================================
@@ -43,104 +54,153 @@ class AnalysisSummary(Base):
     """Core summary and metadata for quick access."""
     __tablename__ = "analysis_summary"
     
-    repo_id = Column(Text, ForeignKey("repositories.id"), primary_key=True)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"), primary_key=True)
     
     # Core fields
-    summary = Column(Text, nullable=False)
-    purpose = Column(Text, nullable=False)
-    architecture_pattern = Column(Text, nullable=False)
-    data_flow = Column(Text, nullable=False)
-    confidence_score = Column(Float, default=0.8)
+    summary: Mapped[str] = mapped_column(Text)
+    purpose: Mapped[str] = mapped_column(Text)
+    architecture_pattern: Mapped[str] = mapped_column(Text)
+    data_flow: Mapped[str] = mapped_column(Text)
+    confidence_score: Mapped[Optional[float]] = mapped_column(Float, default=0.8)
     
     # Metadata
-    created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
-    analysis_version = Column(Text, default="2.0")
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now(), default=None)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now(), default=None)
+    analysis_version: Mapped[Optional[str]] = mapped_column(Text, default="2.0")
 
 
 class TechStack(Base):
     """Individual technology items (many per repository)."""
     __tablename__ = "tech_stack"
+    __table_args__ = (
+        Index("ix_tech_stack_repo_category", "repo_id", "category"),
+    )
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    name = Column(Text, nullable=False)
-    category = Column(Text, nullable=False)
-    version = Column(Text)
-    reasoning = Column(Text)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, init=False)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"))
+    name: Mapped[str] = mapped_column(Text)
+    category: Mapped[str] = mapped_column(Text)
+    version: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    reasoning: Mapped[Optional[str]] = mapped_column(Text, default=None)
 
 
 class ArchitectureComponent(Base):
     """Individual architectural components."""
     __tablename__ = "architecture_components"
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    name = Column(Text, nullable=False)
-    purpose = Column(Text, nullable=False)
-    key_files = Column(Text)  # JSON array as text
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, init=False)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"), index=True)
+    name: Mapped[str] = mapped_column(Text)
+    purpose: Mapped[str] = mapped_column(Text)
+    key_files: Mapped[Optional[str]] = mapped_column(Text, default=None)  # JSON array as text
 
 
 class KeyFile(Base):
     """Key files identified in the repository."""
     __tablename__ = "key_files"
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    file_path = Column(Text, nullable=False)
-    role = Column(Text, nullable=False)  # entry_point|config|core|utility
-    purpose = Column(Text, nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, init=False)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"), index=True)
+    file_path: Mapped[str] = mapped_column(Text)
+    role: Mapped[str] = mapped_column(Text)  # entry_point|config|core|utility
+    purpose: Mapped[str] = mapped_column(Text)
 
 
 class SetupStep(Base):
     """Setup instructions in order."""
     __tablename__ = "setup_steps"
+    __table_args__ = (
+        Index("ix_setup_steps_repo_order", "repo_id", "step_order"),
+    )
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    step_order = Column(Integer, nullable=False)
-    instruction = Column(Text, nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, init=False)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"))
+    step_order: Mapped[int] = mapped_column(Integer)
+    instruction: Mapped[str] = mapped_column(Text)
 
 
 class ContributionArea(Base):
     """Safe areas for new contributors."""
     __tablename__ = "contribution_areas"
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    area = Column(Text, nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, init=False)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"), index=True)
+    area: Mapped[str] = mapped_column(Text)
 
 
 class RiskyArea(Base):
     """Areas requiring caution."""
     __tablename__ = "risky_areas"
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    area = Column(Text, nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, init=False)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"), index=True)
+    area: Mapped[str] = mapped_column(Text)
 
 
 class KnownIssue(Base):
     """Known issues from GitHub analysis."""
     __tablename__ = "known_issues"
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    issue = Column(Text, nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, init=False)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"), index=True)
+    issue: Mapped[str] = mapped_column(Text)
+
+
+class AnalysisResultV2(Base):
+    """
+    Denormalized analysis (one row per repository, lists stored as JSON).
+    Primary read path; the split tables above are still written alongside it.
+    """
+    __tablename__ = "analysis_results"
+    __table_args__ = (
+        Index("idx_analysis_confidence", "confidence_score"),
+        Index("idx_analysis_language", "primary_language"),
+    )
+    
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"), primary_key=True)
+    summary: Mapped[str] = mapped_column(Text)
+    purpose: Mapped[str] = mapped_column(Text)
+    primary_language: Mapped[str] = mapped_column(Text)
+    architecture_pattern: Mapped[str] = mapped_column(Text)
+    confidence_score: Mapped[Optional[float]] = mapped_column(Float, default=0.8)
+    tech_stack_json: Mapped[str] = mapped_column(Text)
+    components_json: Mapped[str] = mapped_column(Text)
+    key_files_json: Mapped[str] = mapped_column(Text)
+    setup_steps_json: Mapped[str] = mapped_column(Text)
+    contribution_areas_json: Mapped[str] = mapped_column(Text)
+    risky_areas_json: Mapped[str] = mapped_column(Text)
+    known_issues_json: Mapped[str] = mapped_column(Text)
+    data_flow: Mapped[str] = mapped_column(Text)
+    raw_llm_response: Mapped[Optional[str]] = mapped_column(Text, default=None)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now(), default=None)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now(), default=None)
+    analysis_version: Mapped[Optional[str]] = mapped_column(Text, default="2.0")
 
 
 # ============================================================================
-# Q&A LOGS (unchanged)
+# Q&A LOGS
 # ============================================================================
 
 class QALog(Base):
     __tablename__ = "qa_logs"
+    __table_args__ = (
+        Index("ix_qalogs_repo_created", "repo_id", "created_at"),
+        # One stored answer per normalized question; re-asks are an index seek
+        Index("ix_qa_repo_qhash", "repo_id", "question_hash", unique=True),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, init=False)
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"))
+    question: Mapped[str] = mapped_column(Text)
+    question_hash: Mapped[bytes] = mapped_column(LargeBinary(8))  # see hash_question()
+    answer: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now(), default=None)
     
-    id = Column(Text, primary_key=True)
-    repo_id = Column(Text, ForeignKey("repositories.id"), nullable=False, index=True)
-    question = Column(Text, nullable=False)
-    answer = Column(Text, nullable=False)
-    created_at = Column(DateTime, server_default=func.now())
+    @staticmethod
+    def hash_question(question: str) -> bytes:
+        """8-byte key of a question, ignoring case, whitespace and trailing punctuation."""
+        normalized = " ".join(question.lower().split()).rstrip("?!. ")
+        return hashlib.blake2b(normalized.encode(), digest_size=8).digest()
 
 
 # ============================================================================
@@ -151,8 +211,8 @@ class RawAnalysisResponse(Base):
     """Store raw Gemini response for debugging/auditing."""
     __tablename__ = "raw_analysis_responses"
     
-    repo_id = Column(Text, ForeignKey("repositories.id"), primary_key=True)
-    raw_json = Column(Text, nullable=False)  # Complete Pydantic model as JSON
-    prompt_used = Column(Text)  # Store prompt for reproducibility
-    model_version = Column(Text)  # gemini-3-flash-preview or pro
-    created_at = Column(DateTime, server_default=func.now())
\ No newline at end of file
+    repo_id: Mapped[str] = mapped_column(Text, ForeignKey("repositories.id"), primary_key=True)
+    raw_json: Mapped[str] = mapped_column(Text)  # Complete Pydantic model as JSON
+    prompt_used: Mapped[Optional[str]] = mapped_column(Text, default=None)  # Store prompt for reproducibility
+    model_version: Mapped[Optional[str]] = mapped_column(Text, default=None)  # gemini-3-flash-preview or pro
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, server_default=func.now(), default=None)
@@ -2,77 +2,188 @@
 Production API Routes - Hardened with proper async flow and persistence.
 Implements Option A: Status-based async flow.
 """
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
-from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from pydantic import BaseModel
+import asyncio
+import gzip
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from typing import Dict, List
+from pydantic import BaseModel, Field
 
-from db.database import get_db, async_session_maker
+from db.database import get_db_ro, get_conn_ro, async_session_maker, get_pool_status
+from models.schemas import Repository, TechStack
 from models.pydantic_models import (
     AnalyzeRepoRequest, AnalyzeRepoResponse,
     AskQuestionRequest, AskQuestionResponse
 )
-from services.analysis_service import AnalysisServiceFinal
-from services.comparative_service import ComparativeAnalysisService
+from services.analysis_service import AnalysisServiceFinal, ACTIVE_STATUSES, RETRYABLE_ERRORS
+from services.comparative_service import (
+    ComparativeAnalysisService, ComparisonType, MIN_COMPARE_REPOS, MAX_COMPARE_REPOS
+)
 from services.code_quality_service import CodeQualityAnalyzer
 from utils.rate_limiter import get_limiter
+from utils.logger import get_logger
+from routes.websocket import get_connection_manager
 
-router = APIRouter()
+# Route results are encoded with orjson rather than jsonable_encoder + json.dumps
+router = APIRouter(default_response_class=ORJSONResponse)
 analysis_service = AnalysisServiceFinal()
 comparative_service = ComparativeAnalysisService()
 code_quality_analyzer = CodeQualityAnalyzer()
 limiter = get_limiter()
+logger = get_logger(__name__)
+
+# Analysis jobs run as tasks outside the request cycle so the handler returns
+# as soon as the session row is committed. At most MAX_CONCURRENT_ANALYSES
+# run at once; the rest wait with status='queued', up to MAX_QUEUED_ANALYSES,
+# beyond which new analyses are refused with 503 instead of queuing unboundedly.
+MAX_CONCURRENT_ANALYSES = 2
+MAX_QUEUED_ANALYSES = 8
+_analysis_slots = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+_analysis_tasks: set = set()
+
+# Singleflight: repo_url -> future of its repo_id, held from the first request
+# until that analysis job finishes. Duplicate submissions join the running
+# analysis instead of starting another. Check-and-insert has no await in
+# between, so on a single event loop it needs no lock.
+_inflight: Dict[str, asyncio.Future] = {}
+
+# A job whose attempt hits a transient GitHub error (see RETRYABLE_ERRORS)
+# is re-run after an exponential backoff, up to ANALYSIS_MAX_ATTEMPTS in all;
+# the last failure is recorded on the session as status='failed'. The slot
+# is released while waiting, so retries never block other analyses.
+ANALYSIS_MAX_ATTEMPTS = 3
+ANALYSIS_RETRY_BACKOFF_SECONDS = 2.0
+
+# Code-quality lookups, built once and executed with {"repo_id": ...}
+_REPO_NAME_BY_ID = (
+    select(Repository.owner, Repository.name)
+    .where(Repository.id == bindparam("repo_id"))
+    .limit(1)
+)
+_TECH_BY_REPO = (
+    select(TechStack.name, TechStack.category)
+    .where(TechStack.repo_id == bindparam("repo_id"))
+    .execution_options(yield_per=128)
+)
+
+
+async def run_analysis_job(repo_id: str) -> None:
+    """
+    Runs one analysis with its OWN database session once a slot is free.
+    This is critical for SQLite persistence.
+    """
+    for attempt in range(1, ANALYSIS_MAX_ATTEMPTS + 1):
+        try:
+            async with _analysis_slots:
+                async with async_session_maker() as bg_db:
+                    await analysis_service.execute_analysis(
+                        repo_id,
+                        bg_db,
+                        on_status=get_connection_manager().send_progress,
+                        retry_on_error=attempt < ANALYSIS_MAX_ATTEMPTS
+                    )
+            return
+        except RETRYABLE_ERRORS as e:
+            delay = ANALYSIS_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            logger.warning(
+                "Background analysis attempt failed, retrying",
+                repo_id=repo_id, attempt=attempt, retry_in=delay, error=str(e)
+            )
+            await asyncio.sleep(delay)
+        except Exception:
+            logger.exception("Background analysis failed", repo_id=repo_id)
+            return
+
+
+def schedule_analysis(repo_id: str) -> asyncio.Task:
+    """Submit an analysis job; a reference is kept until it finishes."""
+    task = asyncio.create_task(run_analysis_job(repo_id))
+    _analysis_tasks.add(task)
+    task.add_done_callback(_analysis_tasks.discard)
+    return task
+
+
+async def _start_or_join_analysis(repo_url: str) -> tuple:
+    """
+    Start an analysis for repo_url, or join the one already in flight.
+    Returns (repo_id, joined).
+    """
+    pending = _inflight.get(repo_url)
+    if pending is not None:
+        return await asyncio.shield(pending), True
+    
+    if len(_inflight) >= MAX_CONCURRENT_ANALYSES + MAX_QUEUED_ANALYSES:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many analyses in progress. Please try again shortly.",
+            headers={"Retry-After": "30"}
+        )
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight[repo_url] = future
+    try:
+        # The writer session is closed, returning the single write
+        # connection, before the job is submitted
+        async with async_session_maker() as db:
+            result = await analysis_service.start_analysis(repo_url, db)
+    except Exception as e:
+        del _inflight[repo_url]
+        future.set_exception(e)
+        future.exception()  # joined callers re-raise it; nobody else needs to
+        raise
+    except BaseException:
+        del _inflight[repo_url]
+        future.cancel()
+        raise
+    
+    repo_id = result['repo_id']
+    future.set_result(repo_id)
+    task = schedule_analysis(repo_id)
+    task.add_done_callback(lambda _: _inflight.pop(repo_url, None))
+    return repo_id, False
 
 
 @router.post("/analyze-repo", response_model=AnalyzeRepoResponse)
-async def analyze_repo(
-    request: AnalyzeRepoRequest,
-    background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db)
-):
+@limiter.limit("10/minute")
+async def analyze_repo(request: Request, analyze_request: AnalyzeRepoRequest):
     """
-    Start repository analysis (returns immediately with status='processing').
+    Start repository analysis (returns immediately with status='queued').
     
     Flow:
     1. Validate URL
-    2. Create repo + analysis_session with status='processing'
+    2. Create repo + analysis_session with status='queued'
     3. Commit to database
-    4. Return immediately with repo_id and status
-    5. Background task does actual analysis
+    4. Submit the analysis job and return repo_id and status
+    5. The job moves the session to 'processing' and does the analysis
+    
+    A URL whose analysis is still running is not analyzed again: the
+    request returns the existing repo_id. Limited to 10/minute per client;
+    503 when the analysis backlog is full.
     """
     try:
         # Validate URL
-        if not request.repo_url or 'github.com' not in request.repo_url:
+        if not analyze_request.repo_url or 'github.com' not in analyze_request.repo_url:
             raise HTTPException(
                 status_code=400,
                 detail="Invalid GitHub repository URL"
             )
         
-        # Start analysis (synchronous setup)
-        result = await analysis_service.start_analysis(request.repo_url, db)
+        repo_id, joined = await _start_or_join_analysis(analyze_request.repo_url)
         
-        repo_id = result['repo_id']
-        
-        # Background task for actual analysis (with NEW session)
-        async def background_analysis():
-            """
-            Runs in background with its OWN database session.
-            This is critical for SQLite persistence.
-            """
-            async with async_session_maker() as bg_db:
-                try:
-                    await analysis_service.execute_analysis(repo_id, bg_db)
-                except Exception as e:
-                    print(f"Background analysis error: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-        
-        background_tasks.add_task(background_analysis)
+        if joined:
+            return AnalyzeRepoResponse(
+                repo_id=repo_id,
+                status="processing",
+                message="Analysis already in progress. Use GET /api/status/{repo_id} to check progress."
+            )
         
         return AnalyzeRepoResponse(
             repo_id=repo_id,
-            status="processing",
-            message="Analysis started. Use GET /api/status/{repo_id} to check progress."
+            status="queued",
+            message="Analysis queued. Use GET /api/status/{repo_id} to check progress."
         )
         
     except ValueError as e:
@@ -89,7 +200,7 @@ async def analyze_repo(
 @router.get("/status/{repo_id}")
 async def get_analysis_status(
     repo_id: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncConnection = Depends(get_conn_ro)
 ):
     """
     Get analysis status for a repository.
@@ -97,14 +208,14 @@ async def get_analysis_status(
     Returns:
         {
             "repo_id": "...",
-            "status": "processing|completed|failed|not_found",
+            "status": "queued|processing|completed|failed|not_found",
             "started_at": "...",
             "completed_at": "...",
             "error_message": "..."
         }
     """
     try:
-        status = await analysis_service.get_status(repo_id, db)
+        status = await analysis_service.get_cached_status(repo_id, db)
         return status
     except Exception as e:
         raise HTTPException(
@@ -113,10 +224,11 @@ async def get_analysis_status(
         )
 
 
-@router.get("/analysis/{repo_id}")
+@router.get("/analysis/{repo_id}", response_model=None)
 async def get_analysis(
+    request: Request,
     repo_id: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncConnection = Depends(get_conn_ro)
 ):
     """
     Get complete analysis for a repository.
@@ -125,10 +237,19 @@ async def get_analysis(
     - Analysis must be completed (status='completed')
     - Returns frontend-ready structured JSON
     - ZERO Gemini calls (reads from database only)
+    
+    The body is cached pre-compressed and sent as-is to clients that
+    accept gzip (GZipMiddleware leaves encoded responses alone).
     """
     try:
-        analysis = await analysis_service.get_analysis(repo_id, db)
-        return analysis
+        body = await analysis_service.get_cached_analysis_gzip(repo_id, db)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            return Response(
+                content=body,
+                media_type="application/json",
+                headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+            )
+        return Response(content=gzip.decompress(body), media_type="application/json")
     except ValueError as e:
         # Analysis not completed or not found
         raise HTTPException(status_code=404, detail=str(e))
@@ -139,10 +260,34 @@ async def get_analysis(
         )
 
 
+async def _ensure_answerable(repo_id: str, db: AsyncSession) -> None:
+    """Raise the HTTP error for a repo whose analysis cannot answer questions yet."""
+    # Check status first (cached, shared with the status endpoint)
+    status = await analysis_service.get_cached_status(repo_id, db)
+    
+    if status['status'] == 'not_found':
+        raise HTTPException(
+            status_code=404,
+            detail=f"Repository not found: {repo_id}"
+        )
+    
+    if status['status'] in ACTIVE_STATUSES:
+        raise HTTPException(
+            status_code=400,
+            detail="Analysis still in progress. Please wait for completion."
+        )
+    
+    if status['status'] == 'failed':
+        raise HTTPException(
+            status_code=400,
+            detail=f"Analysis failed: {status.get('error_message', 'Unknown error')}"
+        )
+
+
 @router.post("/ask", response_model=AskQuestionResponse)
 async def ask_question(
     request: AskQuestionRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_ro)
 ):
     """
     Answer question about analyzed repository.
@@ -154,26 +299,7 @@ async def ask_question(
     - Idempotent and deterministic
     """
     try:
-        # Check status first
-        status = await analysis_service.get_status(request.repo_id, db)
-        
-        if status['status'] == 'not_found':
-            raise HTTPException(
-                status_code=404,
-                detail=f"Repository not found: {request.repo_id}"
-            )
-        
-        if status['status'] == 'processing':
-            raise HTTPException(
-                status_code=400,
-                detail="Analysis still in progress. Please wait for completion."
-            )
-        
-        if status['status'] == 'failed':
-            raise HTTPException(
-                status_code=400,
-                detail=f"Analysis failed: {status.get('error_message', 'Unknown error')}"
-            )
+        await _ensure_answerable(request.repo_id, db)
         
         # Status is 'completed' - safe to answer
         result = await analysis_service.answer_question(
@@ -200,33 +326,75 @@ async def ask_question(
         )
 
 
+@router.post("/ask/stream")
+async def ask_question_stream(
+    request: AskQuestionRequest,
+    db: AsyncSession = Depends(get_db_ro)
+):
+    """
+    Answer question about analyzed repository as Server-Sent Events.
+    
+    Same checks as /ask. Each event is `data: {"delta": "..."}` carrying the
+    next piece of the answer; an `event: done` ends the stream, or an
+    `event: error` with {"detail": ...} if answering fails midway.
+    """
+    await _ensure_answerable(request.repo_id, db)
+    
+    async def events():
+        try:
+            async for delta in analysis_service.stream_answer(request.repo_id, request.question):
+                yield b"data: " + orjson.dumps({"delta": delta}) + b"\n\n"
+        except Exception as e:
+            logger.exception("Streamed answer failed", repo_id=request.repo_id)
+            yield b"event: error\ndata: " + orjson.dumps({"detail": str(e)}) + b"\n\n"
+            return
+        yield b"event: done\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # identity keeps GZipMiddleware from buffering events in its compressor
+        headers={"Cache-Control": "no-cache", "Content-Encoding": "identity"}
+    )
+
+
+# Constant body, encoded once: load balancers probe this endpoint constantly
+_HEALTH_PAYLOAD = orjson.dumps({
+    "status": "healthy",
+    "service": "repo-analyzer-final",
+    "architecture": "production",
+    "features": {
+        "single_gemini_call": True,
+        "split_table_storage": True,
+        "status_based_async": True,
+        "proper_persistence": True,
+        "idempotent_qa": True,
+        "websocket_support": True,
+        "code_quality_analysis": True,
+        "comparative_analysis": True,
+        "rate_limiting": True,
+        "caching": True
+    }
+})
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint with system info."""
-    return {
-        "status": "healthy",
-        "service": "repo-analyzer-final",
-        "architecture": "production",
-        "features": {
-            "single_gemini_call": True,
-            "split_table_storage": True,
-            "status_based_async": True,
-            "proper_persistence": True,
-            "idempotent_qa": True,
-            "websocket_support": True,
-            "code_quality_analysis": True,
-            "comparative_analysis": True,
-            "rate_limiting": True,
-            "caching": True
-        }
-    }
+    return Response(content=_HEALTH_PAYLOAD, media_type="application/json")
+
+
+@router.get("/pool-health")
+async def pool_health():
+    """Database connection pool status."""
+    return {"pool": get_pool_status()}
 
 
 # Pydantic models for new endpoints
 class CompareRequest(BaseModel):
-    """Request model for repository comparison."""
-    repo_ids: List[str]
-    comparison_type: str = "tech_stack"  # tech_stack, architecture, complexity
+    """Request model for repository comparison (out-of-range batches get a 422)."""
+    repo_ids: List[str] = Field(min_length=MIN_COMPARE_REPOS, max_length=MAX_COMPARE_REPOS)
+    comparison_type: ComparisonType = "tech_stack"
 
 
 @router.post("/compare")
@@ -234,7 +402,7 @@ class CompareRequest(BaseModel):
 async def compare_repositories(
     request: Request,
     compare_request: CompareRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_ro)
 ):
     """
     Compare multiple repositories.
@@ -243,6 +411,7 @@ async def compare_repositories(
     - tech_stack: Compare technologies used
     - architecture: Compare architectural patterns
     - complexity: Compare complexity metrics
+    - all: All three, from one fetch of the repository data
     """
     try:
         result = await comparative_service.compare_repositories(
@@ -263,7 +432,7 @@ async def compare_repositories(
 @router.get("/code-quality/{repo_id}")
 async def get_code_quality(
     repo_id: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db_ro)
 ):
     """
     Get code quality metrics for a repository.
@@ -276,24 +445,17 @@ async def get_code_quality(
     """
     try:
         # Get repository data
-        from sqlalchemy import select
-        from models.schemas import Repository, TechStack
-        
-        repo_result = await db.execute(
-            select(Repository).where(Repository.id == repo_id)
-        )
-        repo = repo_result.scalar_one_or_none()
+        repo_result = await db.execute(_REPO_NAME_BY_ID, {"repo_id": repo_id})
+        repo = repo_result.one_or_none()
         
         if not repo:
             raise HTTPException(status_code=404, detail="Repository not found")
         
-        # Get tech stack
-        tech_result = await db.execute(
-            select(TechStack).where(TechStack.repo_id == repo_id)
-        )
+        # Get tech stack (two columns, streamed in chunks, no ORM objects)
+        tech_rows = await db.stream(_TECH_BY_REPO, {"repo_id": repo_id})
         tech_stack = [
-            {"name": t.name, "category": t.category}
-            for t in tech_result.scalars()
+            {"name": name, "category": category}
+            async for name, category in tech_rows
         ]
         
         # Analyze code quality
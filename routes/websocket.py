@@ -2,54 +2,113 @@
 WebSocket support for real-time analysis progress updates.
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from typing import Dict, List, Optional
 import asyncio
-import json
+import orjson
 from utils.logger import get_logger
 
 router = APIRouter()
 logger = get_logger(__name__)
 
-# Store active WebSocket connections
-active_connections: Dict[str, Set[WebSocket]] = {}
+# A subscriber that cannot take a frame within this time is dropped, so one
+# slow client never holds up the broadcast to the others
+SEND_TIMEOUT_SECONDS = 2.0
+
+# Progress messages for a repo arriving within this window are sent as one
+# frame: a single message as-is, several as {"type": "batch", "events": [...]}
+BATCH_WINDOW_SECONDS = 0.05
+
+# Fixed reply frame, encoded once at import
+PONG_FRAME = orjson.dumps({"type": "pong", "message": "Connection alive"}).decode()
+
+# Store active WebSocket connections (repo_id -> {id(websocket): websocket})
+active_connections: Dict[str, Dict[int, WebSocket]] = {}
 
 
 class ConnectionManager:
     """Manage WebSocket connections for analysis progress."""
     
     def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        # repo_id -> {id(websocket): websocket}; O(1) add/remove by key, and
+        # broadcasts iterate a snapshot so the dicts can change meanwhile
+        self.active_connections: Dict[str, Dict[int, WebSocket]] = {}
+        self._pending: Dict[str, List[Dict]] = {}
+        self._flushes: Dict[str, asyncio.Task] = {}
     
     async def connect(self, websocket: WebSocket, repo_id: str):
         """Accept WebSocket connection."""
         await websocket.accept()
-        if repo_id not in self.active_connections:
-            self.active_connections[repo_id] = set()
-        self.active_connections[repo_id].add(websocket)
+        self.active_connections.setdefault(repo_id, {})[id(websocket)] = websocket
         logger.info("WebSocket connected", repo_id=repo_id)
     
     def disconnect(self, websocket: WebSocket, repo_id: str):
         """Remove WebSocket connection."""
-        if repo_id in self.active_connections:
-            self.active_connections[repo_id].discard(websocket)
-            if not self.active_connections[repo_id]:
+        connections = self.active_connections.get(repo_id)
+        if connections is not None:
+            connections.pop(id(websocket), None)
+            if not connections:
                 del self.active_connections[repo_id]
         logger.info("WebSocket disconnected", repo_id=repo_id)
     
     async def send_progress(self, repo_id: str, message: Dict):
-        """Send progress update to all connected clients for a repo."""
-        if repo_id in self.active_connections:
-            disconnected = set()
-            for connection in self.active_connections[repo_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error("Failed to send WebSocket message", error=str(e))
-                    disconnected.add(connection)
-            
-            # Remove disconnected clients
-            for conn in disconnected:
-                self.active_connections[repo_id].discard(conn)
+        """
+        Queue a progress update for all connected clients of a repo.
+        It is delivered, batched with its neighbours, after BATCH_WINDOW_SECONDS.
+        """
+        if not self.active_connections.get(repo_id):
+            return
+        
+        pending = self._pending.get(repo_id)
+        if pending is None:
+            # First message of a window: schedule its flush, which waits for
+            # the previous flush so frames keep their order
+            pending = self._pending[repo_id] = []
+            previous = self._flushes.get(repo_id)
+            self._flushes[repo_id] = asyncio.create_task(
+                self._flush_after_window(repo_id, previous)
+            )
+        pending.append(message)
+    
+    async def _flush_after_window(self, repo_id: str, previous: Optional[asyncio.Task]):
+        """Send everything queued for repo_id during one batching window."""
+        await asyncio.sleep(BATCH_WINDOW_SECONDS)
+        events = self._pending.pop(repo_id, [])
+        if previous is not None:
+            await previous
+        
+        if len(events) == 1:
+            await self._broadcast(repo_id, events[0])
+        elif events:
+            await self._broadcast(repo_id, {"type": "batch", "events": events})
+        
+        if self._flushes.get(repo_id) is asyncio.current_task():
+            del self._flushes[repo_id]
+    
+    async def _broadcast(self, repo_id: str, message: Dict):
+        """Send one frame to all connected clients for a repo, concurrently."""
+        connections = self.active_connections.get(repo_id)
+        if not connections:
+            return
+        
+        # Encode once for every subscriber
+        payload = orjson.dumps(message).decode()
+        targets = tuple(connections.values())
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(connection.send_text(payload), SEND_TIMEOUT_SECONDS)
+                for connection in targets
+            ),
+            return_exceptions=True
+        )
+        
+        # Remove clients that failed or timed out
+        for connection, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error("Failed to send WebSocket message", error=repr(result))
+                connections.pop(id(connection), None)
+        
+        if not connections and self.active_connections.get(repo_id) is connections:
+            del self.active_connections[repo_id]
 
 
 # Global connection manager
@@ -62,34 +121,27 @@ async def websocket_analysis_progress(websocket: WebSocket, repo_id: str):
     WebSocket endpoint for real-time analysis progress.
     
     Clients connect to receive progress updates for a specific repository analysis.
+    
+    Keep-alive is left to the server's protocol-level ping frames (uvicorn
+    --ws-ping-interval / --ws-ping-timeout), so an idle connection costs no
+    timer or JSON work here; client messages are still answered with a pong.
     """
     await manager.connect(websocket, repo_id)
     
     try:
         # Send initial connection message
-        await websocket.send_json({
+        await websocket.send_text(orjson.dumps({
             "type": "connected",
             "repo_id": repo_id,
             "message": "Connected to analysis progress stream"
-        })
+        }).decode())
         
-        # Keep connection alive and listen for client messages
+        # Listen for client messages until the client disconnects
         while True:
-            try:
-                # Wait for client messages (ping/pong)
-                data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
-                
-                # Echo back to confirm connection is alive
-                await websocket.send_json({
-                    "type": "pong",
-                    "message": "Connection alive"
-                })
-            except asyncio.TimeoutError:
-                # Send ping to keep connection alive
-                await websocket.send_json({
-                    "type": "ping",
-                    "message": "Keep-alive ping"
-                })
+            await websocket.receive_text()
+            
+            # Echo back to confirm connection is alive
+            await websocket.send_text(PONG_FRAME)
     
     except WebSocketDisconnect:
         manager.disconnect(websocket, repo_id)
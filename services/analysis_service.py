@@ -6,22 +6,121 @@ Guarantees:
 - Status-based async flow
 - Data persists across restarts
 """
+import asyncio
+import gzip
+import hashlib
 import uuid
-import json
+import orjson
 from datetime import datetime
-from typing import Dict, Optional
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from sqlalchemy.orm import InstrumentedAttribute
 
+from db.database import async_session_maker, read_session_maker
 from models.schemas import (
     Repository, AnalysisSession, AnalysisSummary,
     TechStack, ArchitectureComponent, KeyFile,
     SetupStep, ContributionArea, RiskyArea, KnownIssue,
-    QALog, RawAnalysisResponse
+    AnalysisResultV2, QALog, RawAnalysisResponse
+)
+from services.cache_service import get_cache
+from services.github_service import GitHubService, GitHubUnavailableError, RateLimitError
+from services.gemini_service import (
+    GeminiServiceV2, GeminiAnswerError, RepositoryAnalysis, PROMPT_VERSION, FALLBACK_CONFIDENCE
 )
-from services.github_service import GitHubService
-from services.gemini_service import GeminiServiceV2, RepositoryAnalysis
 from utils.file_filter import FileFilter
+from utils.logger import get_logger
+
+
+# Completed/failed results only change when a new analysis starts, which
+# invalidates them; the TTL bounds staleness across processes.
+RESULT_CACHE_TTL = 300
+# In-flight statuses change without an invalidation hook, so they are only
+# held briefly: concurrent pollers share one query per second
+ACTIVE_STATUS_CACHE_TTL = 1
+TERMINAL_STATUSES = ("completed", "failed")
+ACTIVE_STATUSES = ("queued", "processing")
+# Cached analysis bodies are compressed once at the fastest level; they are
+# served as-is to gzip-capable clients
+ANALYSIS_GZIP_LEVEL = 1
+# Gemini analyses are reused for an identical context, prompt and model
+LLM_ANALYSIS_CACHE_TTL = 7 * 24 * 3600
+# Answers are cached per analysis generation (see _qa_cache_key)
+QA_ANSWER_CACHE_TTL = 86400
+# Files of FILE_CONTENT_MAX_SIZE bytes or more (tree size) are not fetched;
+# the rest go to the prompt cut to FILE_CONTENT_CHARS
+FILE_CONTENT_MAX_SIZE = 10000
+FILE_CONTENT_CHARS = 2000
+# Failures worth another attempt later; anything else fails the analysis
+RETRYABLE_ERRORS = (GitHubUnavailableError, RateLimitError)
+
+
+# Read paths select columns rather than entities, so they run on either an
+# ORM session or a bare Core connection (see get_conn_ro)
+ReadDB = Union[AsyncSession, AsyncConnection]
+
+
+# Per-analysis child tables, replaced wholesale on every re-analysis
+CHILD_TABLE_MODELS = (
+    TechStack, ArchitectureComponent, KeyFile, SetupStep,
+    ContributionArea, RiskyArea, KnownIssue
+)
+
+
+# Receives (repo_id, message) at each status/phase change of an analysis job
+StatusCallback = Callable[[str, Dict], Awaitable[None]]
+
+
+def _new_id() -> str:
+    """New TEXT primary key: 32 hex characters (no dashes) per row and index entry."""
+    return uuid.uuid4().hex
+
+
+def _to_json(value) -> str:
+    """Serialize a value for a JSON TEXT column."""
+    return orjson.dumps(value).decode()
+
+
+async def _upsert_by_repo(db: AsyncSession, model, values: Dict, **on_update) -> None:
+    """
+    INSERT ... ON CONFLICT(repo_id) DO UPDATE for a one-row-per-repo table.
+    An existing row gets every column in values (except repo_id) plus on_update.
+    """
+    stmt = sqlite_insert(model).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[model.repo_id],
+        set_={
+            **{name: stmt.excluded[name] for name in values if name != "repo_id"},
+            **on_update
+        }
+    )
+    await db.execute(stmt)
+
+
+def _json_rows(model, repo_id: str, item, order_by=None):
+    """
+    Scalar subquery: JSON array of item for each of repo_id's rows in model,
+    in insertion order (or order_by). item is a column for a list of
+    strings, or a json_object(...) for a list of objects.
+    """
+    rows = (
+        select(item.label("item"))
+        .where(model.repo_id == repo_id)
+        .order_by(order_by if order_by is not None else model.id)
+        .subquery()
+    )
+    # The JSON subtype does not survive the subquery; json() restores it so
+    # objects are nested rather than quoted
+    value = rows.c.item if isinstance(item, InstrumentedAttribute) else func.json(rows.c.item)
+    return select(func.json_group_array(value)).scalar_subquery()
+
+
+async def _bulk_insert(db: AsyncSession, model, rows: list) -> None:
+    """Insert child rows with one executemany instead of an INSERT per object."""
+    if rows:
+        await db.execute(insert(model), rows)
 
 
 class AnalysisServiceFinal:
@@ -33,13 +132,16 @@ class AnalysisServiceFinal:
         self.github = GitHubService()
         self.gemini = GeminiServiceV2()
         self.file_filter = FileFilter()
+        self.cache = get_cache()
+        self.logger = get_logger(__name__)
     
     async def start_analysis(self, repo_url: str, db: AsyncSession) -> Dict:
         """
         Start repository analysis (synchronous setup + background work).
         
-        Returns immediately with repo_id and status='processing'.
-        Actual analysis happens in background.
+        Returns immediately with repo_id and status='queued'.
+        Actual analysis happens in a background job, which moves the
+        session to 'processing' when it starts.
         """
         # Parse URL
         try:
@@ -56,7 +158,7 @@ class AnalysisServiceFinal:
         if existing_repo:
             repo_id = existing_repo.id
         else:
-            repo_id = str(uuid.uuid4())
+            repo_id = _new_id()
             
             # Create minimal repository record
             repository = Repository(
@@ -72,12 +174,12 @@ class AnalysisServiceFinal:
             # This prevents FOREIGN KEY constraint errors
             await db.flush()
         
-        # Create analysis session with 'processing' status
-        session_id = str(uuid.uuid4())
+        # Create analysis session with 'queued' status
+        session_id = _new_id()
         session = AnalysisSession(
             id=session_id,
             repo_id=repo_id,
-            status="processing",
+            status="queued",
             started_at=datetime.utcnow(),
             gemini_call_count=0
         )
@@ -92,18 +194,30 @@ class AnalysisServiceFinal:
             print(f"✗ Failed to create analysis session: {str(e)}")
             raise
         
+        await self.invalidate_cached_results(repo_id)
+        
         return {
             "repo_id": repo_id,
             "session_id": session_id,
-            "status": "processing"
+            "status": "queued"
         }
     
-    async def execute_analysis(self, repo_id: str, db: AsyncSession) -> None:
+    async def execute_analysis(
+        self,
+        repo_id: str,
+        db: AsyncSession,
+        on_status: Optional[StatusCallback] = None,
+        retry_on_error: bool = False
+    ) -> None:
         """
         Execute the actual analysis (called in background).
         Uses a SEPARATE database session from the request.
         
-        This is the ONLY method that calls Gemini.
+        This is the ONLY method that calls Gemini. Status and phase changes
+        are pushed to on_status (e.g. WebSocket subscribers) as they happen.
+        
+        With retry_on_error, a RETRYABLE_ERRORS failure puts the session back
+        to 'queued' and re-raises, so the caller can run it again later.
         """
         print(f"\n{'='*70}")
         print(f"BACKGROUND ANALYSIS START: {repo_id}")
@@ -124,13 +238,22 @@ class AnalysisServiceFinal:
             select(AnalysisSession)
             .where(AnalysisSession.repo_id == repo_id)
             .order_by(AnalysisSession.started_at.desc())
+            .limit(1)
         )
-        session = result.scalars().first()
+        session = result.scalar_one_or_none()
         
         if not session:
             print(f"✗ Analysis session not found for: {repo_id}")
             return
         
+        # Mark the job as running; the commit also releases the single write
+        # connection while GitHub and Gemini are awaited (loaded objects stay
+        # usable since expire_on_commit=False).
+        session.status = "processing"
+        session.error_message = None
+        await db.commit()
+        await self._push_status(on_status, repo_id, "processing", "fetching_github")
+        
         try:
             # ================================================================
             # STEP 1: Fetch GitHub data (no LLM calls)
@@ -141,21 +264,28 @@ class AnalysisServiceFinal:
             
             print(f"📥 Fetching GitHub data for {owner}/{repo_name}...")
             
-            metadata = await self.github.get_repo_metadata(owner, repo_name)
-            readme = await self.github.get_readme(owner, repo_name)
-            tree = await self.github.get_repository_tree(owner, repo_name)
-            important_files = self.file_filter.filter_important_files(tree, max_files=30)
+            metadata, tree = await asyncio.gather(
+                self.github.get_repo_metadata(owner, repo_name),
+                self.github.get_repository_tree(owner, repo_name)
+            )
             
-            # Fetch limited file contents
-            file_contents = {}
-            for file_info in important_files[:10]:
-                content = await self.github.get_file_content(owner, repo_name, file_info['path'])
-                if content and len(content) < 10000:
-                    file_contents[file_info['path']] = content[:2000]
+            # Nothing pushed since the stored analysis: keep it, skip the rest
+            fingerprint = self._content_fingerprint(metadata, tree)
+            if fingerprint == repo.content_fingerprint and await self._has_stored_result(repo_id, db):
+                print(f"♻ {owner}/{repo_name} unchanged since the last analysis; keeping it")
+                repo.analyzed_at = datetime.utcnow()
+                await self._mark_completed(repo_id, session, db, on_status)
+                return
             
-            # Fetch issues
-            open_issues = await self.github.get_issues(owner, repo_name, state="open", max_issues=30)
-            closed_issues = await self.github.get_issues(owner, repo_name, state="closed", max_issues=20)
+            important_files = self.file_filter.filter_important_files(tree, max_files=30)
+            
+            # Independent requests, so they are awaited together (file
+            # contents are limited to the first 10 important files)
+            (readme, file_contents), open_issues, closed_issues = await asyncio.gather(
+                self._fetch_readme_and_files(owner, repo_name, tree, important_files[:10]),
+                self.github.get_issues(owner, repo_name, state="open", max_issues=30),
+                self.github.get_issues(owner, repo_name, state="closed", max_issues=20)
+            )
             
             print(f"✓ GitHub data fetched: {len(important_files)} files, {len(open_issues)} open issues")
             
@@ -185,10 +315,25 @@ class AnalysisServiceFinal:
             # STEP 3: SINGLE GEMINI API CALL
             # ================================================================
             
-            print(f"🤖 Making SINGLE Gemini API call for {owner}/{repo_name}...")
-            session.gemini_call_count += 1
+            await self._push_status(on_status, repo_id, "processing", "analyzing")
+            llm_cache_key = self.cache._generate_key(
+                "gemini:analysis", PROMPT_VERSION, self.gemini.model_name, context
+            )
+            cached_analysis = await self.cache.get(llm_cache_key)
             
-            analysis: RepositoryAnalysis = await self.gemini.analyze_repository(context)
+            if cached_analysis is not None:
+                print(f"♻ Reusing cached Gemini analysis for {owner}/{repo_name} (repository unchanged)")
+                # The validated model itself is cached: nothing to re-validate
+                analysis = cached_analysis
+            else:
+                print(f"🤖 Making SINGLE Gemini API call for {owner}/{repo_name}...")
+                session.gemini_call_count += 1
+                
+                analysis = await self.gemini.analyze_repository(context)
+                
+                # Fallback analyses are not kept, so the next run retries Gemini
+                if analysis.confidence_score > FALLBACK_CONFIDENCE:
+                    await self.cache.set(llm_cache_key, analysis, ttl=LLM_ANALYSIS_CACHE_TTL)
             
             print(f"✓ Received structured analysis (confidence: {analysis.confidence_score})")
             
@@ -197,190 +342,146 @@ class AnalysisServiceFinal:
             # ================================================================
             
             print(f"💾 Storing analysis in database...")
+            await self._push_status(on_status, repo_id, "processing", "saving")
             
-            # 1. Summary
-            result = await db.execute(
-                select(AnalysisSummary).where(AnalysisSummary.repo_id == repo_id)
-            )
-            existing_summary = result.scalar_one_or_none()
-            
-            if existing_summary:
-                # Update existing
-                existing_summary.summary = analysis.summary
-                existing_summary.purpose = analysis.purpose
-                existing_summary.architecture_pattern = analysis.architecture_pattern
-                existing_summary.data_flow = analysis.data_flow
-                existing_summary.confidence_score = analysis.confidence_score
-                existing_summary.updated_at = datetime.utcnow()
-            else:
-                # Create new
-                summary = AnalysisSummary(
-                    repo_id=repo_id,
-                    summary=analysis.summary,
-                    purpose=analysis.purpose,
-                    architecture_pattern=analysis.architecture_pattern,
-                    data_flow=analysis.data_flow,
-                    confidence_score=analysis.confidence_score
-                )
-                db.add(summary)
+            # Serialized once; the JSON columns below reuse the same dump
+            analysis_dump = analysis.model_dump()
+            raw_json = analysis.model_dump_json()
             
-            # 2. Tech Stack (delete old, insert new)
-            await db.execute(
-                select(TechStack).where(TechStack.repo_id == repo_id)
-            )
-            # Delete existing
-            result = await db.execute(
-                select(TechStack).where(TechStack.repo_id == repo_id)
-            )
-            for old_tech in result.scalars():
-                await db.delete(old_tech)
-            
-            # Insert new
-            for tech_item in analysis.tech_stack:
-                tech = TechStack(
-                    id=str(uuid.uuid4()),
-                    repo_id=repo_id,
-                    name=tech_item.name,
-                    category=tech_item.category,
-                    version=tech_item.version
+            # 1. Summary (inserted, or updated in place on re-analysis)
+            await _upsert_by_repo(db, AnalysisSummary, {
+                "repo_id": repo_id,
+                "summary": analysis.summary,
+                "purpose": analysis.purpose,
+                "architecture_pattern": analysis.architecture_pattern,
+                "data_flow": analysis.data_flow,
+                "confidence_score": analysis.confidence_score
+            }, updated_at=datetime.utcnow())
+            
+            # 2-8. Child tables: one bulk DELETE each clears the previous
+            # analysis, then the new rows are inserted. No child objects are
+            # ever loaded into the session, so there is no state to sync.
+            for model in CHILD_TABLE_MODELS:
+                await db.execute(
+                    delete(model)
+                    .where(model.repo_id == repo_id)
+                    .execution_options(synchronize_session=False)
                 )
-                db.add(tech)
+            
+            # 2. Tech Stack
+            await _bulk_insert(db, TechStack, [
+                {
+                    "repo_id": repo_id,
+                    "name": tech_item.name,
+                    "category": tech_item.category,
+                    "version": tech_item.version
+                }
+                for tech_item in analysis.tech_stack
+            ])
             
             # 3. Components
-            result = await db.execute(
-                select(ArchitectureComponent).where(ArchitectureComponent.repo_id == repo_id)
-            )
-            for old_comp in result.scalars():
-                await db.delete(old_comp)
-            
-            for comp in analysis.components:
-                component = ArchitectureComponent(
-                    id=str(uuid.uuid4()),
-                    repo_id=repo_id,
-                    name=comp.name,
-                    purpose=comp.purpose,
-                    key_files=json.dumps(comp.files)
-                )
-                db.add(component)
+            await _bulk_insert(db, ArchitectureComponent, [
+                {
+                    "repo_id": repo_id,
+                    "name": comp.name,
+                    "purpose": comp.purpose,
+                    "key_files": _to_json(comp.files)
+                }
+                for comp in analysis.components
+            ])
             
             # 4. Key Files
-            result = await db.execute(
-                select(KeyFile).where(KeyFile.repo_id == repo_id)
-            )
-            for old_file in result.scalars():
-                await db.delete(old_file)
-            
-            for file_item in analysis.key_files:
-                key_file = KeyFile(
-                    id=str(uuid.uuid4()),
-                    repo_id=repo_id,
-                    file_path=file_item.path,
-                    role=file_item.role,
-                    purpose=file_item.purpose
-                )
-                db.add(key_file)
+            await _bulk_insert(db, KeyFile, [
+                {
+                    "repo_id": repo_id,
+                    "file_path": file_item.path,
+                    "role": file_item.role,
+                    "purpose": file_item.purpose
+                }
+                for file_item in analysis.key_files
+            ])
             
             # 5. Setup Steps
-            result = await db.execute(
-                select(SetupStep).where(SetupStep.repo_id == repo_id)
-            )
-            for old_step in result.scalars():
-                await db.delete(old_step)
-            
-            for i, step in enumerate(analysis.setup_steps):
-                setup_step = SetupStep(
-                    id=str(uuid.uuid4()),
-                    repo_id=repo_id,
-                    step_order=i + 1,
-                    instruction=step
-                )
-                db.add(setup_step)
+            await _bulk_insert(db, SetupStep, [
+                {
+                    "repo_id": repo_id,
+                    "step_order": i + 1,
+                    "instruction": step
+                }
+                for i, step in enumerate(analysis.setup_steps)
+            ])
             
             # 6. Contribution Areas
-            result = await db.execute(
-                select(ContributionArea).where(ContributionArea.repo_id == repo_id)
-            )
-            for old_area in result.scalars():
-                await db.delete(old_area)
-            
-            for area in analysis.contribution_areas:
-                contrib_area = ContributionArea(
-                    id=str(uuid.uuid4()),
-                    repo_id=repo_id,
-                    area=area
-                )
-                db.add(contrib_area)
+            await _bulk_insert(db, ContributionArea, [
+                {"repo_id": repo_id, "area": area}
+                for area in analysis.contribution_areas
+            ])
             
             # 7. Risky Areas
-            result = await db.execute(
-                select(RiskyArea).where(RiskyArea.repo_id == repo_id)
-            )
-            for old_risky in result.scalars():
-                await db.delete(old_risky)
-            
-            for risky in analysis.risky_areas:
-                risky_area = RiskyArea(
-                    id=str(uuid.uuid4()),
-                    repo_id=repo_id,
-                    area=risky
-                )
-                db.add(risky_area)
+            await _bulk_insert(db, RiskyArea, [
+                {"repo_id": repo_id, "area": risky}
+                for risky in analysis.risky_areas
+            ])
             
             # 8. Known Issues
-            result = await db.execute(
-                select(KnownIssue).where(KnownIssue.repo_id == repo_id)
-            )
-            for old_issue in result.scalars():
-                await db.delete(old_issue)
-            
-            for issue in analysis.known_issues:
-                known_issue = KnownIssue(
-                    id=str(uuid.uuid4()),
-                    repo_id=repo_id,
-                    issue=issue
-                )
-                db.add(known_issue)
+            await _bulk_insert(db, KnownIssue, [
+                {"repo_id": repo_id, "issue": issue}
+                for issue in analysis.known_issues
+            ])
             
             # 9. Raw Response (for debugging)
-            result = await db.execute(
-                select(RawAnalysisResponse).where(RawAnalysisResponse.repo_id == repo_id)
-            )
-            existing_raw = result.scalar_one_or_none()
+            await _upsert_by_repo(db, RawAnalysisResponse, {
+                "repo_id": repo_id,
+                "raw_json": raw_json,
+                "model_version": self.gemini.model_name or "mock"
+            }, created_at=datetime.utcnow())
             
-            if existing_raw:
-                existing_raw.raw_json = analysis.json()
-                existing_raw.model_version = self.gemini.model_name or "mock"
-                existing_raw.created_at = datetime.utcnow()
-            else:
-                raw_response = RawAnalysisResponse(
-                    repo_id=repo_id,
-                    raw_json=analysis.json(),
-                    model_version=self.gemini.model_name or "mock"
-                )
-                db.add(raw_response)
+            # 10. Denormalized result (primary read path)
+            result_values = {
+                "summary": analysis.summary,
+                "purpose": analysis.purpose,
+                "primary_language": analysis.primary_language,
+                "architecture_pattern": analysis.architecture_pattern,
+                "confidence_score": analysis.confidence_score,
+                "tech_stack_json": _to_json(analysis_dump["tech_stack"]),
+                "components_json": _to_json(analysis_dump["components"]),
+                "key_files_json": _to_json(analysis_dump["key_files"]),
+                "setup_steps_json": _to_json(analysis.setup_steps),
+                "contribution_areas_json": _to_json(analysis.contribution_areas),
+                "risky_areas_json": _to_json(analysis.risky_areas),
+                "known_issues_json": _to_json(analysis.known_issues),
+                "data_flow": analysis.data_flow,
+                "raw_llm_response": raw_json
+            }
+            
+            await _upsert_by_repo(
+                db, AnalysisResultV2, {"repo_id": repo_id, **result_values},
+                updated_at=datetime.utcnow()
+            )
             
             # ================================================================
             # STEP 5: Mark session as completed
             # ================================================================
             
-            session.status = "completed"
-            session.completed_at = datetime.utcnow()
-            
-            # CRITICAL: Commit everything
-            try:
-                await db.commit()
-                print(f"✓ Analysis committed to database successfully")
-                print(f"✓ Gemini calls made: {session.gemini_call_count}")
-            except Exception as commit_error:
-                await db.rollback()
-                print(f"✗ Database commit failed: {str(commit_error)}")
-                raise
+            # Only a real analysis lets later runs skip unchanged content;
+            # after a fallback the next run calls Gemini again
+            repo.content_fingerprint = (
+                fingerprint if analysis.confidence_score > FALLBACK_CONFIDENCE else None
+            )
+            await self._mark_completed(repo_id, session, db, on_status)
             
             print(f"{'='*70}")
             print(f"BACKGROUND ANALYSIS COMPLETE: {owner}/{repo_name}")
             print(f"{'='*70}\n")
             
         except Exception as e:
+            if retry_on_error and isinstance(e, RETRYABLE_ERRORS):
+                await self._mark_retrying(repo_id, session, db, on_status, e)
+                raise
+            
+            # Logged while the exception is still being handled, for its traceback
+            self.logger.exception("Background analysis failed", repo_id=repo_id, error=str(e))
+            
             # Mark session as failed
             session.status = "failed"
             session.error_message = str(e)
@@ -389,26 +490,166 @@ class AnalysisServiceFinal:
             try:
                 await db.commit()
                 print(f"✗ Analysis failed and marked in database: {str(e)}")
-            except:
+            except Exception:
                 await db.rollback()
                 print(f"✗ Failed to mark error in database")
             
-            print(f"✗ Background analysis error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            await self.invalidate_cached_results(repo_id)
+            await self._push_status(
+                on_status, repo_id, "failed", "failed", error_message=str(e)
+            )
+    
+    async def _mark_retrying(
+        self,
+        repo_id: str,
+        session: AnalysisSession,
+        db: AsyncSession,
+        on_status: Optional[StatusCallback],
+        error: Exception
+    ) -> None:
+        """Put a session whose attempt hit a transient error back in the queue."""
+        session.status = "queued"
+        session.error_message = str(error)
+        
+        try:
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            print(f"✗ Failed to requeue analysis in database")
+        
+        await self.invalidate_cached_results(repo_id)
+        await self._push_status(
+            on_status, repo_id, "queued", "retrying", error_message=str(error)
+        )
+        print(f"↻ Analysis attempt failed, will retry: {str(error)}")
     
-    async def get_status(self, repo_id: str, db: AsyncSession) -> Dict:
+    async def _mark_completed(
+        self,
+        repo_id: str,
+        session: AnalysisSession,
+        db: AsyncSession,
+        on_status: Optional[StatusCallback]
+    ) -> None:
+        """Commit everything with the session marked completed, then announce it."""
+        session.status = "completed"
+        session.completed_at = datetime.utcnow()
+        
+        # CRITICAL: Commit everything
+        try:
+            await db.commit()
+            print(f"✓ Analysis committed to database successfully")
+            print(f"✓ Gemini calls made: {session.gemini_call_count}")
+        except Exception as commit_error:
+            await db.rollback()
+            print(f"✗ Database commit failed: {str(commit_error)}")
+            raise
+        
+        # Serve status polls from cache from now on
+        await self.invalidate_cached_results(repo_id)
+        await self.cache.set(
+            self._status_cache_key(repo_id),
+            self._status_dict(repo_id, session),
+            ttl=RESULT_CACHE_TTL
+        )
+        await self._push_status(on_status, repo_id, "completed", "completed")
+    
+    def _content_fingerprint(self, metadata: Dict, tree: List[Dict]) -> str:
+        """
+        Digest of what an analysis is derived from: the last push, every
+        file's blob sha, and the prompt and model producing it.
+        """
+        state = [
+            PROMPT_VERSION,
+            self.gemini.model_name,
+            metadata.get('pushed_at'),
+            sorted((item.get('path'), item.get('sha')) for item in tree)
+        ]
+        return hashlib.blake2b(orjson.dumps(state), digest_size=16).hexdigest()
+    
+    @staticmethod
+    async def _has_stored_result(repo_id: str, db: AsyncSession) -> bool:
+        result = await db.execute(
+            select(AnalysisResultV2.repo_id).where(AnalysisResultV2.repo_id == repo_id)
+        )
+        return result.first() is not None
+    
+    async def _fetch_readme_and_files(
+        self, owner: str, repo_name: str, tree: List[Dict], files: List[Dict]
+    ) -> Tuple[Optional[str], Dict[str, str]]:
+        """
+        Fetch the README and file contents in one GraphQL request, or, when
+        that is unavailable, the README and the files concurrently over REST
+        (GitHubService bounds how many requests are in flight).
+        Oversized files are skipped by their tree size, before any transfer,
+        and REST downloads stop at FILE_CONTENT_CHARS bytes.
+        """
+        paths = [f['path'] for f in files if f.get('size', 0) < FILE_CONTENT_MAX_SIZE]
+        
+        batch = await self.github.get_readme_and_files_batch(owner, repo_name, tree, paths)
+        if batch is not None:
+            readme, texts = batch
+            contents = [texts.get(path) for path in paths]
+        else:
+            readme, *contents = await asyncio.gather(
+                self.github.get_readme(owner, repo_name, tree=tree),
+                *(
+                    self.github.get_file_content(
+                        owner, repo_name, path, max_bytes=FILE_CONTENT_CHARS
+                    )
+                    for path in paths
+                )
+            )
+        
+        return readme, {
+            path: content[:FILE_CONTENT_CHARS]
+            for path, content in zip(paths, contents)
+            if content
+        }
+    
+    @staticmethod
+    async def _push_status(
+        on_status: Optional[StatusCallback],
+        repo_id: str,
+        status: str,
+        phase: str,
+        error_message: Optional[str] = None
+    ) -> None:
+        """Publish a status change; delivery problems never fail the analysis."""
+        if on_status is None:
+            return
+        
+        message = {"type": "status", "repo_id": repo_id, "status": status, "phase": phase}
+        if error_message:
+            message["error_message"] = error_message
+        
+        try:
+            await on_status(repo_id, message)
+        except Exception as e:
+            print(f"Warning: Failed to push status: {str(e)}")
+    
+    async def get_status(self, repo_id: str, db: ReadDB) -> Dict:
         """Get analysis status for a repository."""
         result = await db.execute(
-            select(AnalysisSession)
+            select(
+                AnalysisSession.status,
+                AnalysisSession.started_at,
+                AnalysisSession.completed_at,
+                AnalysisSession.error_message
+            )
             .where(AnalysisSession.repo_id == repo_id)
             .order_by(AnalysisSession.started_at.desc())
+            .limit(1)
         )
-        session = result.scalars().first()
+        session = result.one_or_none()
         
         if not session:
             return {"repo_id": repo_id, "status": "not_found"}
         
+        return self._status_dict(repo_id, session)
+    
+    @staticmethod
+    def _status_dict(repo_id: str, session) -> Dict:
+        """Status payload from an AnalysisSession or a row with the same columns."""
         return {
             "repo_id": repo_id,
             "status": session.status,
@@ -417,7 +658,72 @@ class AnalysisServiceFinal:
             "error_message": session.error_message
         }
     
-    async def get_analysis(self, repo_id: str, db: AsyncSession) -> Dict:
+    def _status_cache_key(self, repo_id: str) -> str:
+        return self.cache._generate_key("analysis:status", repo_id)
+    
+    def _analysis_cache_key(self, repo_id: str) -> str:
+        return self.cache._generate_key("analysis:result", repo_id)
+    
+    def _qa_generation_cache_key(self, repo_id: str) -> str:
+        return self.cache._generate_key("analysis:qa_generation", repo_id)
+    
+    async def _qa_cache_key(self, repo_id: str, question_hash: bytes) -> str:
+        """
+        Cache key for an answer under the repository's current analysis
+        generation, a random token dropped by invalidate_cached_results:
+        answers cached against an older analysis then simply stop matching.
+        """
+        generation_key = self._qa_generation_cache_key(repo_id)
+        generation = await self.cache.get(generation_key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            await self.cache.set(generation_key, generation, ttl=QA_ANSWER_CACHE_TTL)
+        return self.cache._generate_key("analysis:qa", repo_id, generation, question_hash.hex())
+    
+    async def invalidate_cached_results(self, repo_id: str) -> None:
+        """Drop cached status/analysis/answers for a repository (new analysis or failure)."""
+        await self.cache.delete(self._status_cache_key(repo_id))
+        await self.cache.delete(self._analysis_cache_key(repo_id))
+        await self.cache.delete(self._analysis_model_cache_key(repo_id))
+        await self.cache.delete(self._qa_generation_cache_key(repo_id))
+    
+    async def get_cached_status(self, repo_id: str, db: ReadDB) -> Dict:
+        """
+        get_status with results cached.
+        Terminal statuses are kept until invalidated (bounded by RESULT_CACHE_TTL);
+        'queued'/'processing' for ACTIVE_STATUS_CACHE_TTL, so transitions show
+        within a second.
+        """
+        key = self._status_cache_key(repo_id)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        status = await self.get_status(repo_id, db)
+        if status['status'] in TERMINAL_STATUSES:
+            ttl = RESULT_CACHE_TTL
+        else:
+            ttl = ACTIVE_STATUS_CACHE_TTL
+        await self.cache.set(key, status, ttl=ttl)
+        return status
+    
+    async def get_cached_analysis_gzip(self, repo_id: str, db: ReadDB) -> bytes:
+        """
+        get_analysis as gzip-compressed JSON, cached as bytes (the completed
+        result is immutable until re-analysis). A hit does no database read
+        and no encoding.
+        """
+        key = self._analysis_cache_key(repo_id)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        analysis = await self.get_analysis(repo_id, db)
+        body = gzip.compress(orjson.dumps(analysis), compresslevel=ANALYSIS_GZIP_LEVEL)
+        await self.cache.set(key, body, ttl=RESULT_CACHE_TTL)
+        return body
+    
+    async def get_analysis(self, repo_id: str, db: ReadDB) -> Dict:
         """
         Retrieve complete analysis from database.
         ZERO Gemini calls - reads only from stored data.
@@ -428,67 +734,71 @@ class AnalysisServiceFinal:
         if status_result['status'] != 'completed':
             raise ValueError(f"Analysis not completed (status: {status_result['status']})")
         
-        # Fetch all data from split tables
-        summary_result = await db.execute(
-            select(AnalysisSummary).where(AnalysisSummary.repo_id == repo_id)
-        )
-        summary = summary_result.scalar_one_or_none()
-        
-        if not summary:
-            raise ValueError("Analysis data not found")
-        
-        # Tech stack
-        tech_result = await db.execute(
-            select(TechStack).where(TechStack.repo_id == repo_id)
-        )
-        tech_stack = [
-            {"name": t.name, "category": t.category, "version": t.version}
-            for t in tech_result.scalars()
-        ]
-        
-        # Components
-        comp_result = await db.execute(
-            select(ArchitectureComponent).where(ArchitectureComponent.repo_id == repo_id)
-        )
-        components = [
-            {"name": c.name, "purpose": c.purpose, "files": json.loads(c.key_files) if c.key_files else []}
-            for c in comp_result.scalars()
-        ]
-        
-        # Key files
-        files_result = await db.execute(
-            select(KeyFile).where(KeyFile.repo_id == repo_id)
-        )
-        key_files = [
-            {"path": f.file_path, "role": f.role, "purpose": f.purpose}
-            for f in files_result.scalars()
-        ]
-        
-        # Setup steps
-        steps_result = await db.execute(
-            select(SetupStep)
-            .where(SetupStep.repo_id == repo_id)
-            .order_by(SetupStep.step_order)
+        # Single-row read from the denormalized table
+        result = await db.execute(
+            select(AnalysisResultV2.__table__).where(AnalysisResultV2.repo_id == repo_id)
         )
-        setup_steps = [s.instruction for s in steps_result.scalars()]
+        stored = result.first()
         
-        # Contribution areas
-        contrib_result = await db.execute(
-            select(ContributionArea).where(ContributionArea.repo_id == repo_id)
-        )
-        contribution_areas = [c.area for c in contrib_result.scalars()]
+        if stored:
+            return {
+                "repo_id": repo_id,
+                "summary": stored.summary,
+                "purpose": stored.purpose,
+                "architecture_pattern": stored.architecture_pattern,
+                "data_flow": stored.data_flow,
+                "confidence_score": stored.confidence_score,
+                "tech_stack": orjson.loads(stored.tech_stack_json),
+                "components": orjson.loads(stored.components_json),
+                "key_files": orjson.loads(stored.key_files_json),
+                "setup_steps": orjson.loads(stored.setup_steps_json),
+                "contribution_areas": orjson.loads(stored.contribution_areas_json),
+                "risky_areas": orjson.loads(stored.risky_areas_json),
+                "known_issues": orjson.loads(stored.known_issues_json),
+                "analyzed_at": stored.created_at.isoformat() if stored.created_at else None,
+                "version": stored.analysis_version
+            }
         
-        # Risky areas
-        risky_result = await db.execute(
-            select(RiskyArea).where(RiskyArea.repo_id == repo_id)
+        # Analyses stored before analysis_results existed: assemble from split tables
+        return await self._get_analysis_from_split_tables(repo_id, db)
+    
+    async def _get_analysis_from_split_tables(self, repo_id: str, db: ReadDB) -> Dict:
+        """
+        Legacy read path across the normalized tables.
+        One round trip: each child table comes back as a JSON array built by
+        a scalar subquery next to the summary columns.
+        """
+        result = await db.execute(
+            select(
+                AnalysisSummary.__table__,
+                _json_rows(TechStack, repo_id, func.json_object(
+                    "name", TechStack.name,
+                    "category", TechStack.category,
+                    "version", TechStack.version
+                )).label("tech_stack"),
+                _json_rows(ArchitectureComponent, repo_id, func.json_object(
+                    "name", ArchitectureComponent.name,
+                    "purpose", ArchitectureComponent.purpose,
+                    "files", func.json(func.coalesce(ArchitectureComponent.key_files, "[]"))
+                )).label("components"),
+                _json_rows(KeyFile, repo_id, func.json_object(
+                    "path", KeyFile.file_path,
+                    "role", KeyFile.role,
+                    "purpose", KeyFile.purpose
+                )).label("key_files"),
+                _json_rows(
+                    SetupStep, repo_id, SetupStep.instruction, order_by=SetupStep.step_order
+                ).label("setup_steps"),
+                _json_rows(ContributionArea, repo_id, ContributionArea.area).label("contribution_areas"),
+                _json_rows(RiskyArea, repo_id, RiskyArea.area).label("risky_areas"),
+                _json_rows(KnownIssue, repo_id, KnownIssue.issue).label("known_issues"),
+            )
+            .where(AnalysisSummary.repo_id == repo_id)
         )
-        risky_areas = [r.area for r in risky_result.scalars()]
+        summary = result.first()
         
-        # Known issues
-        issues_result = await db.execute(
-            select(KnownIssue).where(KnownIssue.repo_id == repo_id)
-        )
-        known_issues = [i.issue for i in issues_result.scalars()]
+        if not summary:
+            raise ValueError("Analysis data not found")
         
         return {
             "repo_id": repo_id,
@@ -497,92 +807,223 @@ class AnalysisServiceFinal:
             "architecture_pattern": summary.architecture_pattern,
             "data_flow": summary.data_flow,
             "confidence_score": summary.confidence_score,
-            "tech_stack": tech_stack,
-            "components": components,
-            "key_files": key_files,
-            "setup_steps": setup_steps,
-            "contribution_areas": contribution_areas,
-            "risky_areas": risky_areas,
-            "known_issues": known_issues,
+            "tech_stack": orjson.loads(summary.tech_stack),
+            "components": orjson.loads(summary.components),
+            "key_files": orjson.loads(summary.key_files),
+            "setup_steps": orjson.loads(summary.setup_steps),
+            "contribution_areas": orjson.loads(summary.contribution_areas),
+            "risky_areas": orjson.loads(summary.risky_areas),
+            "known_issues": orjson.loads(summary.known_issues),
             "analyzed_at": summary.created_at.isoformat() if summary.created_at else None,
             "version": summary.analysis_version
         }
     
+    def _analysis_model_cache_key(self, repo_id: str) -> str:
+        return self.cache._generate_key("analysis:model", repo_id)
+    
+    async def _get_analysis_model(self, repo_id: str, db: ReadDB) -> RepositoryAnalysis:
+        """
+        The stored analysis as a RepositoryAnalysis, for Q&A prompts.
+        Parsed once and cached until the next analysis invalidates it.
+        """
+        key = self._analysis_model_cache_key(repo_id)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # Raw Gemini response: the complete model as stored
+        result = await db.execute(
+            select(RawAnalysisResponse.raw_json).where(RawAnalysisResponse.repo_id == repo_id)
+        )
+        raw_json = result.scalar_one_or_none()
+        
+        if raw_json is not None:
+            # Parsed and validated in one pass by pydantic-core
+            analysis_obj = RepositoryAnalysis.model_validate_json(raw_json)
+        else:
+            # Fallback: construct from the stored analysis (nested lists are
+            # validated in a single model_validate call)
+            analysis_data = await self.get_analysis(repo_id, db)
+            analysis_obj = RepositoryAnalysis.model_validate({
+                'summary': analysis_data['summary'],
+                'purpose': analysis_data['purpose'],
+                'tech_stack': analysis_data['tech_stack'],
+                'primary_language': analysis_data.get('primary_language', 'Unknown'),
+                'architecture_pattern': analysis_data['architecture_pattern'],
+                'components': analysis_data.get('components', []),
+                'data_flow': analysis_data['data_flow'],
+                'key_files': analysis_data.get('key_files', []),
+                'setup_steps': analysis_data.get('setup_steps', []),
+                'contribution_areas': analysis_data.get('contribution_areas', []),
+                'risky_areas': analysis_data.get('risky_areas', []),
+                'known_issues': analysis_data.get('known_issues', []),
+                'confidence_score': analysis_data.get('confidence_score', 0.8)
+            })
+        
+        await self.cache.set(key, analysis_obj, ttl=RESULT_CACHE_TTL)
+        return analysis_obj
+    
     async def answer_question(self, repo_id: str, question: str, db: AsyncSession) -> Dict:
         """
         Answer question using stored analysis data + Gemini for intelligent responses.
-        Uses ONE Gemini call per question for better quality.
+        Uses ONE Gemini call per question for better quality; a question already
+        answered since the latest analysis is served from the cache, or from
+        qa_logs, instead. Fallback answers are not recorded, so the question
+        goes to Gemini again once it is back.
+        
+        db may be a read-only session: the Q&A log is written through a short
+        writer session opened only after the Gemini call returns.
+        """
+        question_hash = QALog.hash_question(question)
+        cache_key = await self._qa_cache_key(repo_id, question_hash)
+        
+        known = await self._find_answer(repo_id, question_hash, cache_key, db)
+        if known is not None:
+            answer, created_at = known
+        else:
+            analysis_obj = await self._get_analysis_model(repo_id, db)
+            
+            # Use Gemini to answer with context
+            answer, from_model = await self.gemini.answer_question(
+                question=question,
+                analysis=analysis_obj,
+                additional_context=self._answer_context(analysis_obj)
+            )
+            if from_model:
+                created_at = await self._record_answer(
+                    repo_id, question, question_hash, answer, cache_key
+                )
+            else:
+                created_at = datetime.utcnow()
+        
+        return {
+            'repo_id': repo_id,
+            'question': question,
+            'answer': answer,
+            'created_at': created_at
+        }
+    
+    async def stream_answer(self, repo_id: str, question: str) -> AsyncIterator[str]:
         """
-        # Get stored analysis
-        analysis_data = await self.get_analysis(repo_id, db)
+        answer_question, yielding the answer text as Gemini generates it.
+        A known answer is yielded whole. If Gemini is unavailable, fails or
+        returns no text before any was yielded, the fallback answer is
+        yielded instead (and not recorded); if it fails midway,
+        GeminiAnswerError propagates and the partial answer is not recorded.
+        Reads use their own short read session, closed before Gemini is
+        called, so the stream can outlive the request's dependencies.
+        """
+        question_hash = QALog.hash_question(question)
+        cache_key = await self._qa_cache_key(repo_id, question_hash)
         
-        # Reconstruct Pydantic model for Gemini
-        from services.gemini_service import RepositoryAnalysis
+        async with read_session_maker() as db:
+            known = await self._find_answer(repo_id, question_hash, cache_key, db)
+            if known is None:
+                analysis_obj = await self._get_analysis_model(repo_id, db)
         
-        # Get raw analysis response
-        result = await db.execute(
-            select(RawAnalysisResponse).where(RawAnalysisResponse.repo_id == repo_id)
+        if known is not None:
+            yield known[0]
+            return
+        
+        chunks = []
+        try:
+            async for chunk in self.gemini.stream_answer(
+                question=question,
+                analysis=analysis_obj,
+                additional_context=self._answer_context(analysis_obj)
+            ):
+                chunks.append(chunk)
+                yield chunk
+        except GeminiAnswerError:
+            if chunks:
+                raise
+            yield self.gemini.fallback_answer(question, analysis_obj)
+            return
+        
+        await self._record_answer(
+            repo_id, question, question_hash, "".join(chunks).strip(), cache_key
         )
-        raw_response = result.scalar_one_or_none()
+    
+    async def _find_answer(
+        self,
+        repo_id: str,
+        question_hash: bytes,
+        cache_key: str,
+        db: AsyncSession
+    ) -> Optional[tuple]:
+        """(answer, created_at) if the question was answered since the latest analysis."""
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        if raw_response:
-            # Parse the stored Pydantic model
-            analysis_obj = RepositoryAnalysis(**json.loads(raw_response.raw_json))
-        else:
-            # Fallback: construct from analysis_data
-            from services.gemini_service import TechStackItem, ComponentItem, FileInsight
-            
-            analysis_obj = RepositoryAnalysis(
-                summary=analysis_data['summary'],
-                purpose=analysis_data['purpose'],
-                tech_stack=[TechStackItem(**t) for t in analysis_data['tech_stack']],
-                primary_language=analysis_data.get('primary_language', 'Unknown'),
-                architecture_pattern=analysis_data['architecture_pattern'],
-                components=[ComponentItem(**c) for c in analysis_data.get('components', [])],
-                data_flow=analysis_data['data_flow'],
-                key_files=[FileInsight(**f) for f in analysis_data.get('key_files', [])],
-                setup_steps=analysis_data.get('setup_steps', []),
-                contribution_areas=analysis_data.get('contribution_areas', []),
-                risky_areas=analysis_data.get('risky_areas', []),
-                known_issues=analysis_data.get('known_issues', []),
-                confidence_score=analysis_data.get('confidence_score', 0.8)
+        # Reuse the stored answer if it is newer than the current analysis
+        result = await db.execute(
+            select(QALog.answer, QALog.created_at)
+            .join(RawAnalysisResponse, RawAnalysisResponse.repo_id == QALog.repo_id)
+            .where(
+                QALog.repo_id == repo_id,
+                QALog.question_hash == question_hash,
+                QALog.created_at >= RawAnalysisResponse.created_at
             )
+            .limit(1)
+        )
+        stored = result.first()
+        if stored is None:
+            return None
         
-        # Build additional context
+        known = (stored.answer, stored.created_at)
+        await self.cache.set(cache_key, known, ttl=QA_ANSWER_CACHE_TTL)
+        return known
+    
+    @staticmethod
+    def _answer_context(analysis_obj: RepositoryAnalysis) -> str:
+        """Extra Q&A context: the key files and their purpose."""
         key_files_context = "\n".join([
-            f"- {f['path']}: {f['purpose']}"
-            for f in analysis_data.get('key_files', [])[:5]
+            f"- {f.path}: {f.purpose}"
+            for f in analysis_obj.key_files[:5]
         ])
+        return f"Key Files:\n{key_files_context}" if key_files_context else ""
+    
+    async def _record_answer(
+        self,
+        repo_id: str,
+        question: str,
+        question_hash: bytes,
+        answer: str,
+        cache_key: str
+    ) -> datetime:
+        """Log a new answer to qa_logs and the cache; returns its timestamp."""
+        created_at = datetime.utcnow()
         
-        additional_context = f"Key Files:\n{key_files_context}" if key_files_context else ""
+        # A blank answer would be served for the question from then on
+        if not answer.strip():
+            self.logger.warning("Blank answer not recorded", repo_id=repo_id)
+            return created_at
         
-        # Use Gemini to answer with context
-        answer = await self.gemini.answer_question(
-            question=question,
-            analysis=analysis_obj,
-            additional_context=additional_context
-        )
-        
-        # Log Q&A
-        qa_id = str(uuid.uuid4())
-        qa_log = QALog(
-            id=qa_id,
+        # Log Q&A (one row per normalized question, replaced on re-ask)
+        stmt = sqlite_insert(QALog).values(
             repo_id=repo_id,
             question=question,
+            question_hash=question_hash,
             answer=answer,
-            created_at=datetime.utcnow()
+            created_at=created_at
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[QALog.repo_id, QALog.question_hash],
+            set_={
+                "question": stmt.excluded.question,
+                "answer": stmt.excluded.answer,
+                "created_at": stmt.excluded.created_at
+            }
         )
-        db.add(qa_log)
         
-        try:
-            await db.commit()
-        except Exception as e:
-            await db.rollback()
-            print(f"Warning: Failed to log Q&A: {str(e)}")
+        async with async_session_maker() as write_db:
+            try:
+                await write_db.execute(stmt)
+                await write_db.commit()
+            except Exception as e:
+                await write_db.rollback()
+                print(f"Warning: Failed to log Q&A: {str(e)}")
         
-        return {
-            'repo_id': repo_id,
-            'question': question,
-            'answer': answer,
-            'created_at': qa_log.created_at
-        }
\ No newline at end of file
+        await self.cache.set(cache_key, (answer, created_at), ttl=QA_ANSWER_CACHE_TTL)
+        return created_at
\ No newline at end of file
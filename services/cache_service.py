@@ -3,28 +3,73 @@ Caching service for reducing external API calls.
 Implements in-memory caching with TTL support.
 """
 import asyncio
-from typing import Any, Callable, Dict, Optional
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import hashlib
-import json
+import time
+import orjson
+
+
+# Entries are spread over this many independent LRU stripes (a power of two)
+SHARD_COUNT = 16
 
 
 class CacheService:
     """
-    In-memory cache with TTL support.
+    In-memory LRU cache with TTL support.
     Can be extended to use Redis for distributed caching.
+    
+    Entries live in SHARD_COUNT stripes, each with its own LRU order, entry
+    limit and byte count, so eviction only ever walks one small stripe.
+    
+    No method awaits while touching the dicts, so on a single event loop
+    every operation is atomic and no lock is needed.
+    
+    get_or_fetch is single-flight: concurrent misses on one key share a
+    single fetch instead of each calling the upstream API.
     """
     
-    def __init__(self, default_ttl: int = 3600):
+    def __init__(self, default_ttl: int = 3600, max_size: int = 10_000):
         """
         Initialize cache service.
         
         Args:
             default_ttl: Default time-to-live in seconds (default: 1 hour)
+            max_size: Entries kept (split evenly across the stripes) before
+                the least recently used is evicted
         """
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        # Per stripe: key -> (value, expiry as a time.monotonic() timestamp, size in bytes)
+        self._shards: "List[OrderedDict[str, Tuple[Any, float, int]]]" = [
+            OrderedDict() for _ in range(SHARD_COUNT)
+        ]
+        self._shard_bytes = [0] * SHARD_COUNT
         self.default_ttl = default_ttl
-        self._lock = asyncio.Lock()
+        self.max_size = max_size
+        self._shard_max_size = -(-max_size // SHARD_COUNT)
+        # key -> the fetch filling it, shared by concurrent get_or_fetch misses
+        self._inflight: Dict[str, asyncio.Task] = {}
+    
+    @staticmethod
+    def _shard_index(key: str) -> int:
+        """Stripe for key: the leading digest bits of a _generate_key key."""
+        try:
+            return int(key[:2], 16) & (SHARD_COUNT - 1)
+        except ValueError:
+            # Not a hex digest
+            return hash(key) & (SHARD_COUNT - 1)
+    
+    @staticmethod
+    def _value_size(value: Any) -> int:
+        """Bytes for bytes/str values, else the JSON-encoded size (approximate for non-JSON values)."""
+        if isinstance(value, (bytes, str)):
+            return len(value)
+        return len(orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS))
+    
+    def _remove(self, index: int, key: str) -> None:
+        """Drop key from stripe index if present, keeping its byte counter in step."""
+        entry = self._shards[index].pop(key, None)
+        if entry is not None:
+            self._shard_bytes[index] -= entry[2]
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """
@@ -38,9 +83,13 @@ class CacheService:
         Returns:
             Cache key string
         """
-        # Create deterministic key from arguments
-        key_data = f"{prefix}:{args}:{sorted(kwargs.items())}"
-        return hashlib.md5(key_data.encode()).hexdigest()
+        # Canonical JSON of the arguments, so equal arguments give equal keys
+        key_data = orjson.dumps(
+            {"p": prefix, "a": args, "k": kwargs},
+            default=str,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        )
+        return hashlib.blake2b(key_data, digest_size=16).hexdigest()
     
     async def get(self, key: str) -> Optional[Any]:
         """
@@ -52,18 +101,21 @@ class CacheService:
         Returns:
             Cached value or None if not found/expired
         """
-        async with self._lock:
-            if key not in self._cache:
-                return None
-            
-            entry = self._cache[key]
-            
-            # Check if expired
-            if datetime.utcnow() > entry['expires_at']:
-                del self._cache[key]
-                return None
-            
-            return entry['value']
+        index = self._shard_index(key)
+        shard = self._shards[index]
+        entry = shard.get(key)
+        if entry is None:
+            return None
+        
+        value, expires_at, _ = entry
+        
+        # Check if expired
+        if time.monotonic() > expires_at:
+            self._remove(index, key)
+            return None
+        
+        shard.move_to_end(key)
+        return value
     
     async def set(self, key: str, value: Any, ttl: Optional[int] = None):
         """
@@ -74,27 +126,30 @@ class CacheService:
             value: Value to cache
             ttl: Time-to-live in seconds (uses default if None)
         """
-        async with self._lock:
-            expires_at = datetime.utcnow() + timedelta(
-                seconds=ttl if ttl is not None else self.default_ttl
-            )
-            
-            self._cache[key] = {
-                'value': value,
-                'expires_at': expires_at,
-                'created_at': datetime.utcnow()
-            }
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        size = self._value_size(value)
+        
+        index = self._shard_index(key)
+        shard = self._shards[index]
+        
+        self._remove(index, key)
+        shard[key] = (value, expires_at, size)
+        self._shard_bytes[index] += size
+        
+        # Evict the stripe's least recently used entries beyond its share
+        while len(shard) > self._shard_max_size:
+            _, (_, _, evicted_size) = shard.popitem(last=False)
+            self._shard_bytes[index] -= evicted_size
     
     async def delete(self, key: str):
         """Delete value from cache."""
-        async with self._lock:
-            if key in self._cache:
-                del self._cache[key]
+        self._remove(self._shard_index(key), key)
     
     async def clear(self):
         """Clear all cache entries."""
-        async with self._lock:
-            self._cache.clear()
+        for shard in self._shards:
+            shard.clear()
+        self._shard_bytes = [0] * SHARD_COUNT
     
     async def get_or_fetch(
         self,
@@ -118,11 +173,30 @@ class CacheService:
         if cached_value is not None:
             return cached_value
         
-        # Cache miss - fetch and store
+        # Cache miss - join the fetch already filling this key, or start it
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fill(key, fetch_func, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._fill_done(key, done))
+        
+        # A cancelled caller leaves the fetch running for the others
+        return await asyncio.shield(task)
+    
+    async def _fill(self, key: str, fetch_func: Callable, ttl: Optional[int]) -> Any:
+        """Fetch a missing value and store it."""
         value = await fetch_func()
         await self.set(key, value, ttl)
         return value
     
+    def _fill_done(self, key: str, task: asyncio.Task) -> None:
+        """Forget a finished fetch, so a failed one is retried by the next miss."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Retrieved, so a failure nobody waited for is not reported as unhandled
+            task.exception()
+    
     def get_stats(self) -> Dict[str, Any]:
         """
         Get cache statistics.
@@ -131,11 +205,8 @@ class CacheService:
             Dictionary with cache stats
         """
         return {
-            'total_entries': len(self._cache),
-            'size_bytes': sum(
-                len(json.dumps(entry['value'])) 
-                for entry in self._cache.values()
-            )
+            'total_entries': sum(len(shard) for shard in self._shards),
+            'size_bytes': sum(self._shard_bytes)
         }
 
 
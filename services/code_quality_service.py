@@ -2,13 +2,56 @@
 Code quality analyzer service.
 Provides objective metrics for repository code quality.
 """
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+import asyncio
 import re
 
 
+# Bit flags for the fixed path markers _scan_files looks for
+HAS_SRC = 1
+HAS_TEST = 2
+HAS_DOC = 4
+HAS_REQ = 8
+HAS_PKG = 16
+HAS_GEMFILE = 32
+HAS_POM = 64
+HAS_CI = 128
+
+# Marker -> flag; test/doc match in any case, the rest case-sensitively
+PATH_MARKERS = {
+    'src/': HAS_SRC,
+    'test': HAS_TEST,
+    'doc': HAS_DOC,
+    'requirements.txt': HAS_REQ,
+    'package.json': HAS_PKG,
+    'Gemfile': HAS_GEMFILE,
+    'pom.xml': HAS_POM,
+    '.github/workflows': HAS_CI,
+    '.gitlab-ci': HAS_CI,
+}
+_CASELESS_MARKERS = ('test', 'doc')
+
+# README section keywords. Each is found with a plain substring test: the
+# C string search beats a combined regex alternation over the same text.
+DOC_SECTIONS = (
+    'installation', 'setup', 'usage', 'example',
+    'contributing', 'license', 'api', 'documentation'
+)
+
+# Distinct (readme, paths, tech stack) inputs whose metrics are memoized
+ANALYSIS_MEMO_SIZE = 256
+
+
 class CodeQualityAnalyzer:
     """Analyze code quality metrics for repositories."""
     
+    # Path suffixes the scan classifies files by
+    _DOC_EXTS = ('.py', '.js', '.java')
+    _SOURCE_EXTS = ('.py', '.js', '.java', '.cpp', '.c')
+    _CONFIG_EXTS = ('.json', '.yml', '.yaml', '.toml')
+    _LOCK_SUFFIXES = ('.lock', 'package-lock.json', 'yarn.lock', 'Pipfile.lock')
+    
     def __init__(self):
         self.test_file_patterns = [
             r'test_.*\.py$',
@@ -18,6 +61,10 @@ class CodeQualityAnalyzer:
             r'.*\.test\.js$',
             r'.*\.spec\.js$'
         ]
+        # All test-file patterns as one alternation: one search per path
+        self._test_re = re.compile('|'.join(f'(?:{p})' for p in self.test_file_patterns))
+        # Per-instance memo: the metrics are a pure function of the inputs
+        self._analyze_cached = lru_cache(maxsize=ANALYSIS_MEMO_SIZE)(self._analyze_inputs)
     
     async def analyze(
         self,
@@ -36,11 +83,42 @@ class CodeQualityAnalyzer:
         Returns:
             Dictionary with quality scores and metrics
         """
+        # CPU-bound scan: run it in a worker thread so the event loop keeps
+        # serving requests meanwhile
+        return await asyncio.to_thread(self._analyze_sync, files, readme, tech_stack)
+    
+    def _analyze_sync(
+        self,
+        files: List[Dict],
+        readme: Optional[str],
+        tech_stack: Optional[List[Dict]]
+    ) -> Dict[str, Any]:
+        """Synchronous body of analyze."""
+        paths = tuple(f.get('path', '') for f in files)
+        tech_key = tuple(tuple(sorted(tech.items())) for tech in tech_stack or ())
+        metrics = self._analyze_cached(readme, paths, tech_key)
+        
+        # Callers get their own copy of the memoized result
+        return {
+            **metrics,
+            "strengths": list(metrics["strengths"]),
+            "improvements": list(metrics["improvements"])
+        }
+    
+    def _analyze_inputs(
+        self,
+        readme: Optional[str],
+        paths: Tuple[str, ...],
+        tech_key: Tuple[Tuple, ...]
+    ) -> Dict[str, Any]:
+        """Compute the metrics from hashable inputs (see _analyze_cached)."""
+        tech_stack = [dict(tech) for tech in tech_key]
+        scan = self._scan_files(paths)
         metrics = {
-            "documentation_score": self._calculate_documentation_score(readme, files),
-            "test_coverage_estimate": self._estimate_test_coverage(files),
-            "code_organization": self._analyze_organization(files),
-            "dependency_health": self._analyze_dependencies(files, tech_stack),
+            "documentation_score": self._calculate_documentation_score(readme, scan),
+            "test_coverage_estimate": self._estimate_test_coverage(scan),
+            "code_organization": self._analyze_organization(scan),
+            "dependency_health": self._analyze_dependencies(scan, tech_stack),
             "overall_score": 0.0,
             "strengths": [],
             "improvements": []
@@ -60,7 +138,55 @@ class CodeQualityAnalyzer:
         
         return metrics
     
-    def _calculate_documentation_score(self, readme: str, files: List[Dict]) -> float:
+    def _scan_files(self, paths: Tuple[str, ...]) -> Dict[str, Any]:
+        """Tally, in one pass over the paths, every path fact the scores use."""
+        doc_files = source_files = test_files = root_files = 0
+        flags = 0
+        has_config = has_lock = False
+        test_re = self._test_re
+        doc_exts = self._DOC_EXTS
+        source_exts = self._SOURCE_EXTS
+        config_exts = self._CONFIG_EXTS
+        lock_suffixes = self._LOCK_SUFFIXES
+        for path in paths:
+            if path.endswith(doc_exts):
+                doc_files += 1
+            if test_re.search(path):
+                test_files += 1
+            elif path.endswith(source_exts):
+                source_files += 1
+            if '/' not in path.lstrip('./'):
+                root_files += 1
+            
+            has_config = has_config or path.endswith(config_exts)
+            has_lock = has_lock or path.endswith(lock_suffixes)
+        
+        # One substring test per marker over all paths at once; NUL never
+        # occurs in a path, so no hit can span two of them
+        joined = '\0'.join(paths)
+        joined_lower = joined.lower()
+        for marker, flag in PATH_MARKERS.items():
+            if marker in (joined_lower if marker in _CASELESS_MARKERS else joined):
+                flags |= flag
+        
+        return {
+            "doc_files": doc_files,
+            "source_files": source_files,
+            "test_files": test_files,
+            "root_files": root_files,
+            "has_src": bool(flags & HAS_SRC),
+            "has_tests": bool(flags & HAS_TEST),
+            "has_docs": bool(flags & HAS_DOC),
+            "has_config": has_config,
+            "has_requirements": bool(flags & HAS_REQ),
+            "has_package_json": bool(flags & HAS_PKG),
+            "has_gemfile": bool(flags & HAS_GEMFILE),
+            "has_pom": bool(flags & HAS_POM),
+            "has_lock": has_lock,
+            "has_ci": bool(flags & HAS_CI),
+        }
+    
+    def _calculate_documentation_score(self, readme: str, scan: Dict[str, Any]) -> float:
         """Calculate documentation quality score (0-10)."""
         score = 0.0
         
@@ -75,99 +201,70 @@ class CodeQualityAnalyzer:
             
             # Check for common sections
             readme_lower = readme.lower()
-            sections = [
-                'installation', 'setup', 'usage', 'example',
-                'contributing', 'license', 'api', 'documentation'
-            ]
-            found_sections = sum(1 for section in sections if section in readme_lower)
-            score += min(found_sections * 0.5, 3.0)
+            # Worth 0.5 each up to 3.0, so stop searching after the sixth
+            found_sections = 0
+            for section in DOC_SECTIONS:
+                if section in readme_lower:
+                    found_sections += 1
+                    if found_sections == 6:
+                        break
+            score += found_sections * 0.5
             
             # Check for code examples
             if '```' in readme or '    ' in readme:
                 score += 2.0
         
         # Check for docstrings/comments in files
-        doc_files = [f for f in files if f.get('path', '').endswith(('.py', '.js', '.java'))]
-        if doc_files:
-            score += min(len(doc_files) * 0.1, 2.0)
+        if scan["doc_files"]:
+            score += min(scan["doc_files"] * 0.1, 2.0)
         
         return min(score, 10.0)
     
-    def _estimate_test_coverage(self, files: List[Dict]) -> float:
+    def _estimate_test_coverage(self, scan: Dict[str, Any]) -> float:
         """Estimate test coverage percentage (0-100)."""
-        source_files = [
-            f for f in files
-            if f.get('path', '').endswith(('.py', '.js', '.java', '.cpp', '.c'))
-            and not any(re.search(pattern, f.get('path', '')) for pattern in self.test_file_patterns)
-        ]
-        
-        test_files = [
-            f for f in files
-            if any(re.search(pattern, f.get('path', '')) for pattern in self.test_file_patterns)
-        ]
-        
-        if not source_files:
+        if not scan["source_files"]:
             return 0.0
         
         # Rough estimate: assume each test file covers 5 source files
-        estimated_coverage = min((len(test_files) * 5) / len(source_files) * 100, 100)
+        estimated_coverage = min((scan["test_files"] * 5) / scan["source_files"] * 100, 100)
         
         return round(estimated_coverage, 1)
     
-    def _analyze_organization(self, files: List[Dict]) -> float:
+    def _analyze_organization(self, scan: Dict[str, Any]) -> float:
         """Analyze code organization score (0-10)."""
         score = 5.0  # Start with average
         
-        file_paths = [f.get('path', '') for f in files]
-        
         # Check for organized directory structure
-        has_src = any('src/' in path for path in file_paths)
-        has_tests = any('test' in path.lower() for path in file_paths)
-        has_docs = any('doc' in path.lower() for path in file_paths)
-        has_config = any(path.endswith(('.json', '.yml', '.yaml', '.toml')) for path in file_paths)
-        
-        if has_src:
+        if scan["has_src"]:
             score += 1.0
-        if has_tests:
+        if scan["has_tests"]:
             score += 2.0
-        if has_docs:
+        if scan["has_docs"]:
             score += 1.0
-        if has_config:
+        if scan["has_config"]:
             score += 1.0
         
         # Penalize too many root-level files
-        root_files = [p for p in file_paths if '/' not in p.lstrip('./')]
-        if len(root_files) > 15:
+        if scan["root_files"] > 15:
             score -= 1.0
         
         return min(max(score, 0.0), 10.0)
     
-    def _analyze_dependencies(self, files: List[Dict], tech_stack: List[Dict]) -> float:
+    def _analyze_dependencies(self, scan: Dict[str, Any], tech_stack: List[Dict]) -> float:
         """Analyze dependency health score (0-10)."""
         score = 7.0  # Start with good score
         
         # Check for dependency files
-        file_paths = [f.get('path', '') for f in files]
-        
-        has_requirements = any('requirements.txt' in path for path in file_paths)
-        has_package_json = any('package.json' in path for path in file_paths)
-        has_gemfile = any('Gemfile' in path for path in file_paths)
-        has_pom = any('pom.xml' in path for path in file_paths)
-        
-        if any([has_requirements, has_package_json, has_gemfile, has_pom]):
+        if (scan["has_requirements"] or scan["has_package_json"]
+                or scan["has_gemfile"] or scan["has_pom"]):
             score += 1.0
         
         # Check for lock files (good practice)
-        has_lock = any(
-            path.endswith(('.lock', 'package-lock.json', 'yarn.lock', 'Pipfile.lock'))
-            for path in file_paths
-        )
-        if has_lock:
+        if scan["has_lock"]:
             score += 1.0
         
         # Bonus for having CI/CD
-        has_ci = any('.github/workflows' in path or '.gitlab-ci' in path for path in file_paths)
-        if has_ci:
+        if scan["has_ci"]:
             score += 1.0
         
         return min(score, 10.0)
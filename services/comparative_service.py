@@ -2,20 +2,36 @@
 Comparative analysis service.
 Compare multiple repositories across various dimensions.
 """
-from typing import List, Dict, Any
+from collections import Counter
+import asyncio
+from typing import List, Dict, Any, Literal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
 from models.schemas import Repository, AnalysisSummary, TechStack
+from services.cache_service import get_cache
+
+# Bounds on how many repositories one comparison may cover
+MIN_COMPARE_REPOS = 2
+MAX_COMPARE_REPOS = 5
+
+ComparisonType = Literal["tech_stack", "architecture", "complexity", "all"]
+
+# Comparison results are reused until one of the repositories is
+# re-analyzed (which moves its analyzed_at) or this many seconds pass
+COMPARISON_CACHE_TTL = 300
 
 
 class ComparativeAnalysisService:
     """Service for comparing multiple repositories."""
     
+    def __init__(self):
+        self.cache = get_cache()
+    
     async def compare_repositories(
         self,
         repo_ids: List[str],
         db: AsyncSession,
-        comparison_type: str = "tech_stack"
+        comparison_type: ComparisonType = "tech_stack"
     ) -> Dict[str, Any]:
         """
         Compare multiple repositories.
@@ -23,99 +39,158 @@ class ComparativeAnalysisService:
         Args:
             repo_ids: List of repository IDs to compare
             db: Database session
-            comparison_type: Type of comparison (tech_stack, architecture, complexity)
+            comparison_type: Type of comparison (tech_stack, architecture, complexity),
+                or all three over a single fetch of the repository data
             
         Returns:
             Comparison results
         """
-        if len(repo_ids) < 2:
-            raise ValueError("At least 2 repositories required for comparison")
+        if len(repo_ids) < MIN_COMPARE_REPOS:
+            raise ValueError(f"At least {MIN_COMPARE_REPOS} repositories required for comparison")
         
-        if len(repo_ids) > 5:
-            raise ValueError("Maximum 5 repositories can be compared at once")
+        if len(repo_ids) > MAX_COMPARE_REPOS:
+            raise ValueError(f"Maximum {MAX_COMPARE_REPOS} repositories can be compared at once")
         
-        # Fetch repository data
-        repos_data = []
-        for repo_id in repo_ids:
-            data = await self._fetch_repo_data(repo_id, db)
-            if data:
-                repos_data.append(data)
+        # Latest analysis time of the repositories: part of the cache key,
+        # so a re-analysis makes earlier results unreachable
+        last_analyzed = (await db.execute(
+            select(func.max(Repository.analyzed_at)).where(Repository.id.in_(repo_ids))
+        )).scalar()
+        cache_key = self.cache._generate_key(
+            "compare", list(repo_ids), comparison_type, last_analyzed
+        )
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        repos_data = await self._fetch_repos_data(repo_ids, db)
         
         if len(repos_data) < 2:
             raise ValueError("Not enough valid repositories for comparison")
         
-        # Perform comparison based on type
+        result = await self._compare(repos_data, comparison_type)
+        await self.cache.set(cache_key, result, ttl=COMPARISON_CACHE_TTL)
+        return result
+    
+    async def _compare(self, repos_data: List[Dict], comparison_type: ComparisonType) -> Dict:
+        """Run the requested comparison over fetched repository data."""
         if comparison_type == "tech_stack":
             return await self._compare_tech_stack(repos_data)
         elif comparison_type == "architecture":
             return await self._compare_architecture(repos_data)
         elif comparison_type == "complexity":
             return await self._compare_complexity(repos_data)
+        elif comparison_type == "all":
+            return await self._compare_all(repos_data)
         else:
             raise ValueError(f"Unknown comparison type: {comparison_type}")
     
-    async def _fetch_repo_data(self, repo_id: str, db: AsyncSession) -> Dict:
-        """Fetch repository data for comparison."""
-        # Get repository
+    async def _fetch_repos_data(self, repo_ids: List[str], db: AsyncSession) -> List[Dict]:
+        """
+        Fetch comparison data for all repositories in three IN queries,
+        in repo_ids order; unknown ids are skipped.
+        Only the columns the comparisons read are selected.
+        """
         repo_result = await db.execute(
-            select(Repository).where(Repository.id == repo_id)
+            select(
+                Repository.id, Repository.owner, Repository.name,
+                Repository.repo_url, Repository.primary_language
+            ).where(Repository.id.in_(repo_ids))
         )
-        repo = repo_result.scalar_one_or_none()
-        
-        if not repo:
-            return None
+        repos = {row.id: row for row in repo_result}
         
-        # Get analysis summary
         summary_result = await db.execute(
-            select(AnalysisSummary).where(AnalysisSummary.repo_id == repo_id)
+            select(
+                AnalysisSummary.repo_id, AnalysisSummary.architecture_pattern,
+                AnalysisSummary.data_flow, AnalysisSummary.confidence_score
+            ).where(AnalysisSummary.repo_id.in_(repos))
         )
-        summary = summary_result.scalar_one_or_none()
+        summaries = {row.repo_id: row for row in summary_result}
         
-        # Get tech stack
         tech_result = await db.execute(
-            select(TechStack).where(TechStack.repo_id == repo_id)
+            select(TechStack.repo_id, TechStack.name, TechStack.category)
+            .where(TechStack.repo_id.in_(repos))
+        )
+        tech_stacks: Dict[str, List] = {}
+        for row in tech_result:
+            tech_stacks.setdefault(row.repo_id, []).append(row)
+        
+        repos_data = []
+        for repo_id in repo_ids:
+            repo = repos.get(repo_id)
+            if repo is None:
+                continue
+            repos_data.append({
+                "repo_id": repo_id,
+                "name": f"{repo.owner}/{repo.name}",
+                "url": repo.repo_url,
+                "primary_language": repo.primary_language,
+                "summary": summaries.get(repo_id),
+                "tech_stack": tech_stacks.get(repo_id, [])
+            })
+        
+        return repos_data
+    
+    async def _compare_all(self, repos_data: List[Dict]) -> Dict:
+        """Run every comparison over the same repository data."""
+        tech_stack, architecture, complexity = await asyncio.gather(
+            self._compare_tech_stack(repos_data),
+            self._compare_architecture(repos_data),
+            self._compare_complexity(repos_data)
         )
-        tech_stack = list(tech_result.scalars())
         
         return {
-            "repo_id": repo_id,
-            "name": f"{repo.owner}/{repo.name}",
-            "url": repo.repo_url,
-            "primary_language": repo.primary_language,
-            "summary": summary,
-            "tech_stack": tech_stack
+            "comparison_type": "all",
+            "repositories": [r["name"] for r in repos_data],
+            "tech_stack": tech_stack,
+            "architecture": architecture,
+            "complexity": complexity
         }
     
     async def _compare_tech_stack(self, repos_data: List[Dict]) -> Dict:
         """Compare technology stacks."""
-        # Collect all technologies
-        all_techs = {}
-        for repo in repos_data:
-            repo_techs = set()
+        # Columnar technology table: name, category, and a bitmask of the
+        # repos using it (bit i = repos_data[i])
+        tech_index: Dict[str, int] = {}
+        tech_names: List[str] = []
+        tech_categories: List[str] = []
+        tech_masks: List[int] = []
+        for i, repo in enumerate(repos_data):
+            bit = 1 << i
             for tech in repo.get("tech_stack", []):
-                tech_name = tech.name
-                repo_techs.add(tech_name)
-                
-                if tech_name not in all_techs:
-                    all_techs[tech_name] = {
-                        "repos": [],
-                        "category": tech.category
-                    }
-                all_techs[tech_name]["repos"].append(repo["name"])
+                idx = tech_index.get(tech.name)
+                if idx is None:
+                    idx = tech_index[tech.name] = len(tech_names)
+                    tech_names.append(tech.name)
+                    tech_categories.append(tech.category)
+                    tech_masks.append(0)
+                tech_masks[idx] |= bit
         
         # Find common and unique technologies
         repo_names = [r["name"] for r in repos_data]
+        all_repos = (1 << len(repos_data)) - 1
         common_techs = [
-            tech for tech, data in all_techs.items()
-            if len(data["repos"]) == len(repos_data)
+            name for name, mask in zip(tech_names, tech_masks) if mask == all_repos
         ]
         
         unique_techs = {}
-        for repo in repos_data:
-            repo_tech_names = {tech.name for tech in repo.get("tech_stack", [])}
-            unique = repo_tech_names - set(common_techs)
+        for i, name in enumerate(repo_names):
+            bit = 1 << i
+            unique = sorted(
+                tech for tech, mask in zip(tech_names, tech_masks)
+                if mask & bit and mask != all_repos
+            )
             if unique:
-                unique_techs[repo["name"]] = list(unique)
+                unique_techs[name] = unique
+        
+        # Row-per-technology shape only for the response
+        all_techs = {
+            tech: {
+                "repos": [repo_names[i] for i in range(len(repo_names)) if mask >> i & 1],
+                "category": category
+            }
+            for tech, category, mask in zip(tech_names, tech_categories, tech_masks)
+        }
         
         return {
             "comparison_type": "tech_stack",
@@ -139,19 +214,15 @@ class ComparativeAnalysisService:
                 }
         
         # Find common patterns
-        patterns = [data["pattern"] for data in architectures.values()]
-        pattern_counts = {}
-        for pattern in patterns:
-            pattern_counts[pattern] = pattern_counts.get(pattern, 0) + 1
-        
-        most_common_pattern = max(pattern_counts.items(), key=lambda x: x[1])[0] if pattern_counts else None
+        pattern_counts = Counter(data["pattern"] for data in architectures.values())
+        most_common_pattern = pattern_counts.most_common(1)[0][0] if pattern_counts else None
         
         return {
             "comparison_type": "architecture",
             "repositories": [r["name"] for r in repos_data],
             "architectures": architectures,
             "most_common_pattern": most_common_pattern,
-            "pattern_distribution": pattern_counts
+            "pattern_distribution": dict(pattern_counts)
         }
     
     async def _compare_complexity(self, repos_data: List[Dict]) -> Dict:
@@ -175,10 +246,16 @@ class ComparativeAnalysisService:
             reverse=True
         )
         
+        # Repositories without a summary yet (queued or failed) are not ranked
+        if sorted_repos:
+            summary = f"Most complex: {sorted_repos[0][0]}, Least complex: {sorted_repos[-1][0]}"
+        else:
+            summary = "Not enough analyzed repositories"
+        
         return {
             "comparison_type": "complexity",
             "repositories": [r["name"] for r in repos_data],
             "complexity_scores": complexity_scores,
             "ranking": [{"repo": name, **data} for name, data in sorted_repos],
-            "summary": f"Most complex: {sorted_repos[0][0]}, Least complex: {sorted_repos[-1][0]}"
+            "summary": summary
         }
@@ -2,10 +2,14 @@
 Refactored Gemini 3 service - SINGLE API CALL architecture.
 Generates all analysis in one structured response to avoid rate limits.
 """
-import os
+import asyncio
 import json
-from typing import Dict, List, Optional
-from pydantic import BaseModel, Field, validator
+import os
+import re
+from contextlib import aclosing, suppress
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field, ValidationError, validator
+from utils.logger import get_logger
 
 # Try to import Google GenAI SDK
 try:
@@ -15,6 +19,118 @@ except ImportError:
     GEMINI_AVAILABLE = False
 
 
+# Bump whenever _build_unified_prompt changes meaning: cached analyses are
+# keyed on it, so older ones stop matching
+PROMPT_VERSION = "v1"
+
+# Confidence reported by _fallback_analysis (no client, API error, bad JSON)
+FALLBACK_CONFIDENCE = 0.3
+
+class GeminiAnswerError(Exception):
+    """Gemini gave no complete answer: no client, or the call failed (possibly midway)."""
+
+
+# Phrases RepositoryAnalysis.no_fluff strips, in any letter case, in one pass
+FLUFF_PHRASES = (
+    "it's important to note",
+    "it should be noted",
+    "as mentioned",
+    "basically",
+    "essentially",
+    "in conclusion",
+    "to summarize"
+)
+_FLUFF_RE = re.compile("|".join(map(re.escape, FLUFF_PHRASES)), re.IGNORECASE)
+_SPACE_RUN_RE = re.compile(r" {2,}")
+
+# Fixed tail of the analysis prompt (see _build_unified_prompt), built once;
+# only the {primary_lang} placeholder varies per repository
+_ANALYSIS_INSTRUCTIONS = """CRITICAL REQUIREMENTS:
+1. Return ONLY valid JSON matching this exact schema
+2. Use SHORT, SCANNABLE strings (no essays)
+3. Be SPECIFIC and EVIDENCE-BASED (no speculation)
+4. NO fluff phrases like "it's important to note" or "essentially"
+5. Keep arrays to specified max lengths
+6. All strings must be concise and frontend-ready
+
+Return JSON with these exact keys:
+
+{
+  "summary": "Comprehensive 10-20 sentence explanation covering: what this project does, its main features, key technologies used, target audience, primary use cases, and overall architecture approach. Be thorough and detailed.",
+  "purpose": "What problem does this solve (max 150 chars)",
+  "tech_stack": [
+    {
+      "name": "TechName",
+      "category": "Language|Framework|Database|Tool|Library",
+      "version": "1.0.0 or null"
+    }
+  ],
+  "primary_language": "{primary_lang}",
+  "architecture_pattern": "MVC|Microservices|Monolith|Library|CLI|etc",
+  "components": [
+    {
+      "name": "ComponentName",
+      "purpose": "What it does (max 200 chars)",
+      "files": ["file1.py", "file2.py"]
+    }
+  ],
+  "data_flow": "How data moves through system (max 300 chars)",
+  "key_files": [
+    {
+      "path": "path/to/file",
+      "role": "entry_point|config|core|utility",
+      "purpose": "One-line explanation (max 150 chars)"
+    }
+  ],
+  "setup_steps": [
+    "Step 1: Clone repo",
+    "Step 2: Install dependencies",
+    "Step 3-6: ..."
+  ],
+  "contribution_areas": [
+    "Documentation",
+    "Tests",
+    "etc"
+  ],
+  "risky_areas": [
+    "Authentication module",
+    "Database migrations"
+  ],
+  "known_issues": [
+    "Issue pattern 1 from GitHub",
+    "Issue pattern 2"
+  ],
+  "confidence_score": 0.9
+}
+
+Analyze based on README and file structure. Use evidence only. Be concise. Return valid JSON only.
+"""
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _extract_json_object(text: str) -> str:
+    """
+    Slice the first JSON object out of a model response, dropping markdown
+    fences and prose around it.
+    
+    The C decoder scans forward from the first "{" to where that object
+    closes, so braces inside string literals or in prose after the object
+    are never mistaken for its end. An object that does not parse is
+    returned up to the end of the text (and no "{" at all returns the text
+    unchanged) so that validation reports the problem.
+    """
+    start = text.find("{")
+    if start < 0:
+        return text
+    
+    try:
+        _, end = _JSON_DECODER.raw_decode(text, start)
+    except ValueError:
+        return text[start:]
+    return text[start:end]
+
+
 # ============================================================================
 # STRUCTURED OUTPUT SCHEMA - Enforces deterministic, frontend-ready responses
 # ============================================================================
@@ -73,18 +189,16 @@ class RepositoryAnalysis(BaseModel):
     @validator('summary', 'purpose', 'data_flow')
     def no_fluff(cls, v):
         """Remove common AI fluff phrases."""
-        fluff_phrases = [
-            "it's important to note",
-            "it should be noted",
-            "as mentioned",
-            "basically",
-            "essentially",
-            "in conclusion",
-            "to summarize"
-        ]
-        result = v
-        for phrase in fluff_phrases:
-            result = result.replace(phrase, "").replace(phrase.title(), "")
+        # Most text has none: substring tests rule that out far faster
+        # than the case-insensitive regex scan
+        lowered = v.lower()
+        if not any(phrase in lowered for phrase in FLUFF_PHRASES):
+            return v.strip()
+        
+        result, removed = _FLUFF_RE.subn("", v)
+        if removed:
+            # Close the gaps the removed phrases leave behind
+            result = _SPACE_RUN_RE.sub(" ", result)
         return result.strip()
 
 
@@ -100,6 +214,7 @@ class GeminiServiceV2:
         self.client = None
         self.model_name = None
         self.using_mock = False
+        self.logger = get_logger(__name__)
         
         gemini_model = os.getenv("GEMINI_MODEL", "flash")
         
@@ -118,31 +233,34 @@ class GeminiServiceV2:
         
         if self.client and self.model_name:
             try:
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt
-                )
-                raw_text = response.text
-                
-                # Clean response (remove markdown fences if present)
-                if raw_text.strip().startswith("```"):
-                    raw_text = raw_text.split("```json")[-1].split("```")[0].strip()
-                elif raw_text.strip().startswith("{"):
-                    pass  # Already clean JSON
-                else:
-                    # Try to extract JSON from text
-                    import re
-                    json_match = re.search(r'\{.*\}', raw_text, re.DOTALL)
-                    if json_match:
-                        raw_text = json_match.group(0)
+                # Streamed, so the event loop keeps serving other requests
+                # while the response is generated. Chunks are joined only
+                # when one could close the object, and the first valid parse
+                # ends the stream (skipping any trailing prose)
+                chunks = []
+                analysis = None
+                async with aclosing(self._stream_text(prompt)) as stream:
+                    async for text in stream:
+                        chunks.append(text)
+                        if text.rstrip().endswith("}"):
+                            try:
+                                analysis = RepositoryAnalysis.model_validate_json(
+                                    _extract_json_object("".join(chunks))
+                                )
+                                break
+                            except ValueError:
+                                pass
                 
-                # Parse and validate
-                data = json.loads(raw_text)
-                analysis = RepositoryAnalysis(**data)
+                if analysis is None:
+                    # Stream ended without a valid object: let validation
+                    # report what is wrong with it
+                    analysis = RepositoryAnalysis.model_validate_json(
+                        _extract_json_object("".join(chunks))
+                    )
                 return analysis
                 
-            except json.JSONDecodeError as e:
-                print(f"Gemini returned invalid JSON: {str(e)}")
+            except ValidationError as e:
+                print(f"Gemini returned invalid analysis JSON: {str(e)}")
                 return self._fallback_analysis(context)
             except Exception as e:
                 print(f"Gemini API error: {str(e)}")
@@ -150,6 +268,29 @@ class GeminiServiceV2:
         else:
             return self._fallback_analysis(context)
     
+    async def _stream_text(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Yield the non-empty text chunks of a streamed Gemini response.
+        The SDK's aio stream reads the response body on the event loop, so
+        the synchronous stream is advanced in a worker thread instead.
+        """
+        chunks = self.client.models.generate_content_stream(
+            model=self.model_name,
+            contents=prompt
+        )
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    return
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            # Closes the HTTP response when the caller stops early; after a
+            # cancellation the worker may still be inside next()
+            with suppress(ValueError):
+                chunks.close()
+    
     def _build_unified_prompt(self, context: Dict) -> str:
         """Build single comprehensive prompt for all analysis."""
         
@@ -190,67 +331,9 @@ Entry Points: {', '.join(entry_files) if entry_files else 'Not identified'}
 GitHub Issues: {issues_summary}
 Recent Issue Patterns: {', '.join(issue_titles[:5]) if issue_titles else 'No issues'}
 
-CRITICAL REQUIREMENTS:
-1. Return ONLY valid JSON matching this exact schema
-2. Use SHORT, SCANNABLE strings (no essays)
-3. Be SPECIFIC and EVIDENCE-BASED (no speculation)
-4. NO fluff phrases like "it's important to note" or "essentially"
-5. Keep arrays to specified max lengths
-6. All strings must be concise and frontend-ready
-
-Return JSON with these exact keys:
-
-{{
-  "summary": "Comprehensive 10-20 sentence explanation covering: what this project does, its main features, key technologies used, target audience, primary use cases, and overall architecture approach. Be thorough and detailed.",
-  "purpose": "What problem does this solve (max 150 chars)",
-  "tech_stack": [
-    {{
-      "name": "TechName",
-      "category": "Language|Framework|Database|Tool|Library",
-      "version": "1.0.0 or null"
-    }}
-  ],
-  "primary_language": "{primary_lang}",
-  "architecture_pattern": "MVC|Microservices|Monolith|Library|CLI|etc",
-  "components": [
-    {{
-      "name": "ComponentName",
-      "purpose": "What it does (max 200 chars)",
-      "files": ["file1.py", "file2.py"]
-    }}
-  ],
-  "data_flow": "How data moves through system (max 300 chars)",
-  "key_files": [
-    {{
-      "path": "path/to/file",
-      "role": "entry_point|config|core|utility",
-      "purpose": "One-line explanation (max 150 chars)"
-    }}
-  ],
-  "setup_steps": [
-    "Step 1: Clone repo",
-    "Step 2: Install dependencies",
-    "Step 3-6: ..."
-  ],
-  "contribution_areas": [
-    "Documentation",
-    "Tests",
-    "etc"
-  ],
-  "risky_areas": [
-    "Authentication module",
-    "Database migrations"
-  ],
-  "known_issues": [
-    "Issue pattern 1 from GitHub",
-    "Issue pattern 2"
-  ],
-  "confidence_score": 0.9
-}}
-
-Analyze based on README and file structure. Use evidence only. Be concise. Return valid JSON only.
 """
-        return prompt
+        # Static instructions and schema, with the one variable value spliced in
+        return prompt + _ANALYSIS_INSTRUCTIONS.replace("{primary_lang}", primary_lang, 1)
     
     def _fallback_analysis(self, context: Dict) -> RepositoryAnalysis:
         """Deterministic fallback when Gemini unavailable."""
@@ -279,14 +362,63 @@ Analyze based on README and file structure. Use evidence only. Be concise. Retur
             contribution_areas=["Documentation"],
             risky_areas=[],
             known_issues=[],
-            confidence_score=0.3
+            confidence_score=FALLBACK_CONFIDENCE
         )
     
-    async def answer_question(self, question: str, analysis: RepositoryAnalysis, additional_context: str = "") -> str:
+    async def answer_question(
+        self, question: str, analysis: RepositoryAnalysis, additional_context: str = ""
+    ) -> Tuple[str, bool]:
         """
         Answer question using pre-analyzed data.
         This is a SEPARATE call (for Q&A), not part of initial analysis.
+        
+        Returns (answer, from_model): when Gemini gives no complete answer,
+        the fallback answer with from_model False.
         """
+        try:
+            chunks = [
+                chunk async for chunk in self.stream_answer(question, analysis, additional_context)
+            ]
+        except GeminiAnswerError:
+            return self.fallback_answer(question, analysis), False
+        return "".join(chunks).strip(), True
+    
+    async def stream_answer(
+        self, question: str, analysis: RepositoryAnalysis, additional_context: str = ""
+    ) -> AsyncIterator[str]:
+        """
+        Answer question, yielding the text as Gemini generates it.
+        Raises GeminiAnswerError when Gemini is unavailable, fails (even
+        after some text was yielded) or returns no text at all; callers
+        decide whether fallback_answer can stand in.
+        """
+        if not (self.client and self.model_name):
+            raise GeminiAnswerError("Gemini client not available")
+        
+        prompt = self._build_answer_prompt(question, analysis, additional_context)
+        streamed = False
+        try:
+            async with aclosing(self._stream_text(prompt)) as stream:
+                async for text in stream:
+                    streamed = True
+                    yield text
+        except Exception as e:
+            # One line per failure, no traceback: during an outage every
+            # question lands here
+            self.logger.warning("Gemini Q&A failed", error=str(e), midway=streamed)
+            if streamed:
+                raise GeminiAnswerError(f"Answer interrupted: {e}") from e
+            raise GeminiAnswerError(f"Gemini Q&A failed: {e}") from e
+        
+        # Only chunks without text (e.g. a safety-blocked response): no answer
+        if not streamed:
+            self.logger.warning("Gemini Q&A returned no text")
+            raise GeminiAnswerError("Gemini returned no answer text")
+    
+    def _build_answer_prompt(
+        self, question: str, analysis: RepositoryAnalysis, additional_context: str
+    ) -> str:
+        """Build the Q&A prompt from the stored analysis."""
         # Build rich context from analysis
         tech_details = "\n".join([
             f"- {t.name} ({t.category})" + (f" v{t.version}" if t.version else "")
@@ -351,25 +483,9 @@ CRITICAL RULES:
 
 Answer:"""
         
-        if self.client and self.model_name:
-            try:
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt
-                )
-                return response.text.strip()
-            except Exception as e:
-                # Log the error for debugging
-                print(f"⚠️ Gemini API error in Q&A: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                # Fallback to simple response
-                return self._generate_fallback_answer(question, analysis)
-        else:
-            print("⚠️ Gemini client not available, using fallback answers")
-            return self._generate_fallback_answer(question, analysis)
+        return prompt
     
-    def _generate_fallback_answer(self, question: str, analysis: RepositoryAnalysis) -> str:
+    def fallback_answer(self, question: str, analysis: RepositoryAnalysis) -> str:
         """Generate a contextual answer when Gemini is unavailable."""
         question_lower = question.lower()
         
@@ -2,19 +2,74 @@
 GitHub service for fetching repository data.
 Handles API interaction, rate limiting, and error handling.
 """
+import asyncio
 import httpx
 import os
 import re
+import time
 from typing import Optional, Dict, List, Tuple
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from services.cache_service import get_cache
 from utils.logger import get_logger
 
+# owner/repo from a GitHub URL; a ".git" suffix and anything after the
+# repo name (trailing slash, /tree/main, ...) are left out of the groups
+_REPO_URL_RE = re.compile(
+    r'(?:https?://)?(?:www\.)?github\.com/([^/]+)/([^/]+?)(?:\.git)?(?:/|$)'
+)
+
+
+class GitHubUnavailableError(ValueError):
+    """GitHub could not be reached or answered with a 5xx; a later retry may succeed."""
+
+
+class RateLimitError(Exception):
+    """GitHub's rate limit is exhausted and will not reset soon enough to wait for."""
+    
+    def __init__(self, reset_at: Optional[float] = None):
+        self.reset_at = reset_at
+        if reset_at:
+            resets = datetime.utcfromtimestamp(reset_at).strftime("%H:%M:%S UTC")
+            message = f"GitHub API rate limit exceeded (resets at {resets})"
+        else:
+            message = "GitHub API rate limit exceeded"
+        super().__init__(message)
+
 
 class GitHubService:
     """Service for interacting with GitHub REST API."""
     
     BASE_URL = "https://api.github.com"
+    GRAPHQL_URL = "https://api.github.com/graphql"
+    
+    # Issues are listed in full pages (GitHub's maximum), following the Link
+    # header until enough non-PR issues are collected or MAX_ISSUE_PAGES
+    ISSUES_PER_PAGE = 100
+    MAX_ISSUE_PAGES = 3
+    
+    # Below this many remaining requests, calls wait for the window to reset
+    RATE_LIMIT_RESERVE = 10
+    # Rate-limited responses are retried with backoff (or Retry-After) up to
+    # MAX_RETRIES times; a wait longer than MAX_RATE_LIMIT_WAIT is not slept
+    # out, RateLimitError is raised instead
+    MAX_RETRIES = 5
+    MAX_RATE_LIMIT_WAIT = 60.0
+    
+    # One pooled client serves every request, so connections (and their TLS
+    # sessions) are kept alive across the many calls of an analysis; over
+    # HTTP/2 concurrent requests to a host share one connection
+    CLIENT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    # Slow responses get the full read time, but a dead host or an
+    # exhausted pool fails fast instead of queueing
+    CLIENT_TIMEOUT = httpx.Timeout(30.0, connect=5.0, write=10.0, pool=5.0)
+    
+    # READMEs are cached under the blob shas of the candidate README files,
+    # so an entry can never be stale; issues may lag by ISSUES_CACHE_TTL
+    README_CACHE_TTL = 24 * 3600
+    ISSUES_CACHE_TTL = 600
+    # Where GitHub looks for the README, in its order of precedence
+    README_DIRS = (".github/", "", "docs/")
     
     def __init__(self):
         self.token = os.getenv("GITHUB_TOKEN")
@@ -26,6 +81,136 @@ class GitHubService:
         
         self.cache = get_cache()
         self.logger = get_logger(__name__)
+        
+        # X-RateLimit-Resource ("core", "graphql") -> (remaining, reset epoch)
+        self._rate_limits: Dict[str, Tuple[int, float]] = {}
+        
+        # Requests in flight at once across all analyses, kept low enough
+        # not to trip GitHub's secondary (concurrency) rate limit
+        self._slots = asyncio.Semaphore(int(os.getenv("GITHUB_CONCURRENCY", "8")))
+        
+        # Created on first use, inside the running event loop
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it if needed."""
+        if self._client is None or self._client.is_closed:
+            # Certificates are verified; behind a TLS-intercepting corporate
+            # proxy, point GITHUB_CA_BUNDLE at its CA certificate(s)
+            self._client = httpx.AsyncClient(
+                timeout=self.CLIENT_TIMEOUT,
+                verify=os.getenv("GITHUB_CA_BUNDLE") or True,
+                limits=self.CLIENT_LIMITS,
+                http2=True
+            )
+        return self._client
+    
+    async def warm_up(self) -> None:
+        """
+        Open a connection to the API ahead of the first analysis, so that it
+        does not pay for the TCP and TLS handshakes. Failures are ignored.
+        """
+        try:
+            await self._get_client().head(self.BASE_URL)
+        except httpx.HTTPError as e:
+            self.logger.warning("GitHub connection warm-up failed", error=str(e))
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client (application shutdown)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        method: str,
+        url: str,
+        resource: str = "core",
+        **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request within GitHub's rate limit.
+        At most GITHUB_CONCURRENCY requests are in flight at a time. Waits
+        for the reset when the remaining budget is nearly spent, and retries
+        rate-limited (429, or 403 with Retry-After/zero remaining) responses
+        with exponential backoff. Raises RateLimitError when the limit
+        cannot be waited out.
+        """
+        for attempt in range(self.MAX_RETRIES):
+            await self._wait_for_budget(resource)
+            async with self._slots:
+                response = await getattr(client, method.lower())(url, **kwargs)
+            self._record_rate_limit(response)
+            
+            if not self._is_rate_limited(response):
+                return response
+            
+            delay = self._retry_delay(response, attempt)
+            if delay > self.MAX_RATE_LIMIT_WAIT:
+                break
+            self.logger.warning("GitHub rate limited, retrying", url=url, delay=delay)
+            await asyncio.sleep(delay)
+        
+        raise RateLimitError(self._rate_limits.get(resource, (0, None))[1])
+    
+    @staticmethod
+    def _retry_delay(response: httpx.Response, attempt: int) -> float:
+        """
+        Seconds to wait before retrying a rate-limited response: its
+        Retry-After (delay-seconds or an HTTP-date), else the time to
+        X-RateLimit-Reset when nothing remains, else exponential backoff.
+        """
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return max(float(retry_after), 0.0)
+            except ValueError:
+                pass
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass  # unparseable: fall through to the other signals
+        
+        reset_at = response.headers.get("X-RateLimit-Reset")
+        if response.headers.get("X-RateLimit-Remaining") == "0" and reset_at is not None:
+            try:
+                return max(float(reset_at) - time.time(), 0.0)
+            except ValueError:
+                pass
+        
+        return 0.5 * 2 ** attempt
+    
+    async def _wait_for_budget(self, resource: str) -> None:
+        """Sleep until the reset if fewer than RATE_LIMIT_RESERVE requests remain."""
+        remaining, reset_at = self._rate_limits.get(resource, (None, None))
+        if remaining is None or remaining >= self.RATE_LIMIT_RESERVE:
+            return
+        
+        wait = reset_at - time.time()
+        if wait <= 0:
+            return
+        if wait > self.MAX_RATE_LIMIT_WAIT:
+            raise RateLimitError(reset_at)
+        self.logger.warning("GitHub rate limit nearly spent, waiting", resource=resource, wait=wait)
+        await asyncio.sleep(wait)
+    
+    def _record_rate_limit(self, response: httpx.Response) -> None:
+        """Remember the budget reported by GitHub's rate-limit headers."""
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset_at = response.headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset_at is not None:
+            resource = response.headers.get("X-RateLimit-Resource", "core")
+            self._rate_limits[resource] = (int(remaining), float(reset_at))
+    
+    @staticmethod
+    def _is_rate_limited(response: httpx.Response) -> bool:
+        if response.status_code == 429:
+            return True
+        return response.status_code == 403 and (
+            "Retry-After" in response.headers
+            or response.headers.get("X-RateLimit-Remaining") == "0"
+        )
     
     def parse_repo_url(self, repo_url: str) -> Tuple[str, str]:
         """
@@ -35,12 +220,7 @@ class GitHubService:
         - https://github.com/owner/repo.git
         - github.com/owner/repo
         """
-        # Remove trailing slashes and .git
-        repo_url = repo_url.rstrip('/').replace('.git', '')
-        
-        # Extract owner and repo using regex
-        pattern = r'(?:https?://)?(?:www\.)?github\.com/([^/]+)/([^/]+)'
-        match = re.search(pattern, repo_url)
+        match = _REPO_URL_RE.search(repo_url)
         
         if not match:
             raise ValueError(f"Invalid GitHub repository URL: {repo_url}")
@@ -57,120 +237,298 @@ class GitHubService:
         async def fetch():
             url = f"{self.BASE_URL}/repos/{owner}/{repo}"
             
-            # Create client with SSL verification disabled for potential corporate proxies
-            async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-                try:
-                    self.logger.info("Fetching repo metadata", owner=owner, repo=repo)
-                    response = await client.get(url, headers=self.headers)
-                    response.raise_for_status()
-                    return response.json()
-                except httpx.HTTPStatusError as e:
-                    if e.response.status_code == 404:
-                        raise ValueError(f"Repository not found: {owner}/{repo}")
-                    elif e.response.status_code == 403:
-                        raise ValueError("GitHub API rate limit exceeded. Please add GITHUB_TOKEN to .env")
-                    else:
-                        raise ValueError(f"GitHub API error: {e.response.status_code}")
-                except httpx.ConnectError as e:
-                    raise ValueError(f"Failed to connect to GitHub: Connection error. Check your internet connection.")
-                except httpx.TimeoutException as e:
-                    raise ValueError(f"Failed to connect to GitHub: Request timed out. Check your internet connection.")
-                except httpx.RequestError as e:
-                    raise ValueError(f"Failed to connect to GitHub: {str(e)}")
+            client = self._get_client()
+            try:
+                self.logger.info("Fetching repo metadata", owner=owner, repo=repo)
+                response = await self._send(client, "GET", url, headers=self.headers)
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    raise ValueError(f"Repository not found: {owner}/{repo}")
+                elif e.response.status_code == 403:
+                    raise ValueError("GitHub API rate limit exceeded. Please add GITHUB_TOKEN to .env")
+                elif e.response.status_code >= 500:
+                    raise GitHubUnavailableError(f"GitHub API error: {e.response.status_code}")
+                else:
+                    raise ValueError(f"GitHub API error: {e.response.status_code}")
+            except httpx.ConnectError as e:
+                raise GitHubUnavailableError(f"Failed to connect to GitHub: Connection error. Check your internet connection.")
+            except httpx.TimeoutException as e:
+                raise GitHubUnavailableError(f"Failed to connect to GitHub: Request timed out. Check your internet connection.")
+            except httpx.RequestError as e:
+                raise GitHubUnavailableError(f"Failed to connect to GitHub: {str(e)}")
         
         return await self.cache.get_or_fetch(cache_key, fetch, ttl=3600)
     
-    async def get_readme(self, owner: str, repo: str) -> Optional[str]:
-        """Fetch README content."""
+    async def get_readme(
+        self, owner: str, repo: str, tree: Optional[List[Dict]] = None
+    ) -> Optional[str]:
+        """
+        Fetch README content.
+        Given the repository tree, the content is cached under the shas of
+        the README candidates in it (see README_DIRS).
+        
+        HTTP errors give None, but RateLimitError propagates on purpose: the
+        analysis is then retried later rather than run without the README.
+        """
+        readme_blobs = self._readme_blobs(tree) if tree else None
+        if not readme_blobs:
+            return await self._fetch_readme(owner, repo)
+        
+        cache_key = self.cache._generate_key("github:readme", owner, repo, readme_blobs)
+        readme = await self.cache.get(cache_key)
+        if readme is None:
+            readme = await self._fetch_readme(owner, repo)
+            if readme is not None:
+                await self.cache.set(cache_key, readme, ttl=self.README_CACHE_TTL)
+        return readme
+    
+    def _readme_blobs(self, tree: List[Dict]) -> List[Tuple[str, str]]:
+        """(path, sha) of every README* blob directly in one of README_DIRS."""
+        blobs = []
+        for item in tree:
+            path = item.get('path', '')
+            directory, _, name = path.rpartition('/')
+            if (
+                item.get('type') == 'blob'
+                and name.lower().startswith('readme')
+                and (directory + '/' if directory else '') in self.README_DIRS
+            ):
+                blobs.append((path, item.get('sha')))
+        return sorted(blobs)
+    
+    async def _fetch_readme(self, owner: str, repo: str) -> Optional[str]:
+        """Download the README GitHub picks for the default branch."""
         url = f"{self.BASE_URL}/repos/{owner}/{repo}/readme"
         
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                # Fetch raw content
-                if 'download_url' in data:
-                    content_response = await client.get(data['download_url'])
-                    content_response.raise_for_status()
-                    return content_response.text
-                return None
-            except (httpx.HTTPStatusError, httpx.RequestError):
-                return None
+        client = self._get_client()
+        try:
+            response = await self._send(client, "GET", url, headers=self.headers)
+            response.raise_for_status()
+            data = response.json()
+            
+            # Fetch raw content
+            if 'download_url' in data:
+                content_response = await self._send(client, "GET", data['download_url'])
+                content_response.raise_for_status()
+                return content_response.text
+            return None
+        except (httpx.HTTPStatusError, httpx.RequestError):
+            return None
     
-    async def get_file_content(self, owner: str, repo: str, path: str) -> Optional[str]:
-        """Fetch content of a specific file."""
+    async def get_file_content(
+        self, owner: str, repo: str, path: str, max_bytes: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Fetch content of a specific file.
+        With max_bytes, only that many leading bytes are downloaded (Range).
+        HTTP errors give None, but RateLimitError propagates on purpose (see get_readme).
+        """
         url = f"{self.BASE_URL}/repos/{owner}/{repo}/contents/{path}"
+        range_headers = {"Range": f"bytes=0-{max_bytes - 1}"} if max_bytes else None
         
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                if isinstance(data, dict) and 'download_url' in data:
-                    content_response = await client.get(data['download_url'])
-                    content_response.raise_for_status()
-                    return content_response.text
-                return None
-            except (httpx.HTTPStatusError, httpx.RequestError):
-                return None
+        client = self._get_client()
+        try:
+            response = await self._send(client, "GET", url, headers=self.headers)
+            response.raise_for_status()
+            data = response.json()
+            
+            if isinstance(data, dict) and 'download_url' in data:
+                content_response = await self._send(
+                    client, "GET", data['download_url'], headers=range_headers
+                )
+                content_response.raise_for_status()
+                return content_response.text
+            return None
+        except (httpx.HTTPStatusError, httpx.RequestError):
+            return None
+    
+    async def get_file_contents_batch(
+        self, owner: str, repo: str, paths: List[str]
+    ) -> Optional[Dict[str, Optional[str]]]:
+        """
+        Fetch the text of several files (default branch) in ONE GraphQL request.
+        Returns {path: text or None for missing/binary files}, or None when
+        GraphQL is unavailable (it requires a token) or the request fails.
+        """
+        if not self.token or not paths:
+            return None
+        
+        # One aliased object() lookup per file; paths travel as variables so
+        # they need no escaping
+        declarations = "".join(f", $e{i}: String!" for i in range(len(paths)))
+        lookups = " ".join(
+            f"f{i}: object(expression: $e{i}) {{ ... on Blob {{ text }} }}"
+            for i in range(len(paths))
+        )
+        query = (
+            f"query($owner: String!, $name: String!{declarations}) "
+            f"{{ repository(owner: $owner, name: $name) {{ {lookups} }} }}"
+        )
+        variables = {"owner": owner, "name": repo}
+        variables.update({f"e{i}": f"HEAD:{path}" for i, path in enumerate(paths)})
+        
+        client = self._get_client()
+        try:
+            response = await self._send(
+                client,
+                "POST",
+                self.GRAPHQL_URL,
+                resource="graphql",
+                headers=self.headers,
+                json={"query": query, "variables": variables}
+            )
+            response.raise_for_status()
+            repository = (response.json().get("data") or {}).get("repository")
+        except (httpx.HTTPStatusError, httpx.RequestError, ValueError):
+            return None
+        
+        if repository is None:
+            return None
+        
+        return {
+            path: (repository.get(f"f{i}") or {}).get("text")
+            for i, path in enumerate(paths)
+        }
+    
+    async def get_readme_and_files_batch(
+        self, owner: str, repo: str, tree: List[Dict], paths: List[str]
+    ) -> Optional[Tuple[Optional[str], Dict[str, Optional[str]]]]:
+        """
+        Fetch the README together with several files in ONE GraphQL request.
+        The README is located in the tree (and reused from the get_readme
+        cache when its blobs are unchanged), so it rides along with the
+        file lookups instead of costing two REST round trips.
+        Returns (readme, {path: text}), or None when GraphQL is unavailable
+        or the request fails.
+        """
+        if not self.token or not tree:
+            return None
+        
+        readme_blobs = self._readme_blobs(tree)
+        readme = readme_path = cache_key = None
+        if readme_blobs:
+            cache_key = self.cache._generate_key("github:readme", owner, repo, readme_blobs)
+            readme = await self.cache.get(cache_key)
+            if readme is None:
+                readme_path = self._readme_path(readme_blobs)
+        
+        batch_paths = list(paths)
+        if readme_path and readme_path not in paths:
+            batch_paths.append(readme_path)
+        if not batch_paths:
+            return readme, {}
+        
+        batch = await self.get_file_contents_batch(owner, repo, batch_paths)
+        if batch is None:
+            return None
+        
+        if readme_path:
+            readme = batch.get(readme_path)
+            if readme is not None:
+                await self.cache.set(cache_key, readme, ttl=self.README_CACHE_TTL)
+        return readme, {path: batch.get(path) for path in paths}
+    
+    def _readme_path(self, readme_blobs: List[Tuple[str, str]]) -> str:
+        """
+        The README GitHub would show among _readme_blobs: the first of
+        README_DIRS holding one, and there README.md over other variants.
+        """
+        def rank(blob: Tuple[str, str]) -> Tuple[int, bool, str]:
+            directory, _, name = blob[0].rpartition('/')
+            return (
+                self.README_DIRS.index(directory + '/' if directory else ''),
+                name.lower() != 'readme.md',
+                blob[0]
+            )
+        
+        return min(readme_blobs, key=rank)[0]
     
     async def list_files(self, owner: str, repo: str, path: str = "") -> List[Dict]:
-        """List files in a directory."""
+        """
+        List files in a directory.
+        HTTP errors give [], but RateLimitError propagates on purpose (see get_readme).
+        """
         url = f"{self.BASE_URL}/repos/{owner}/{repo}/contents/{path}"
         
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                if isinstance(data, list):
-                    return data
-                return []
-            except (httpx.HTTPStatusError, httpx.RequestError):
-                return []
+        client = self._get_client()
+        try:
+            response = await self._send(client, "GET", url, headers=self.headers)
+            response.raise_for_status()
+            data = response.json()
+            
+            if isinstance(data, list):
+                return data
+            return []
+        except (httpx.HTTPStatusError, httpx.RequestError):
+            return []
     
     async def get_issues(self, owner: str, repo: str, state: str = "open", max_issues: int = 50) -> List[Dict]:
-        """Fetch repository issues."""
+        """
+        Fetch up to max_issues repository issues (most recently updated first), cached.
+        HTTP errors give [], but RateLimitError propagates on purpose (see get_readme).
+        """
+        cache_key = self.cache._generate_key("github:issues", owner, repo, state, max_issues)
+        issues = await self.cache.get(cache_key)
+        if issues is None:
+            issues = await self._fetch_issues(owner, repo, state, max_issues)
+            if issues is None:
+                return []
+            await self.cache.set(cache_key, issues, ttl=self.ISSUES_CACHE_TTL)
+        return issues
+    
+    async def _fetch_issues(
+        self, owner: str, repo: str, state: str, max_issues: int
+    ) -> Optional[List[Dict]]:
+        """List issues from the API; None if the first page could not be fetched."""
         url = f"{self.BASE_URL}/repos/{owner}/{repo}/issues"
         params = {
             "state": state,
-            "per_page": min(max_issues, 100),
+            "per_page": self.ISSUES_PER_PAGE,
             "sort": "updated",
             "direction": "desc"
         }
+        issues: List[Dict] = []
         
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            try:
-                response = await client.get(url, headers=self.headers, params=params)
+        client = self._get_client()
+        try:
+            for _ in range(self.MAX_ISSUE_PAGES):
+                response = await self._send(client, "GET", url, headers=self.headers, params=params)
                 response.raise_for_status()
-                issues = response.json()
                 
                 # Filter out pull requests (they appear in issues endpoint)
-                return [issue for issue in issues if 'pull_request' not in issue]
-            except (httpx.HTTPStatusError, httpx.RequestError):
-                return []
+                issues.extend(issue for issue in response.json() if 'pull_request' not in issue)
+                
+                next_page = response.links.get("next")
+                if len(issues) >= max_issues or next_page is None:
+                    break
+                # The next URL already carries the query string
+                url, params = next_page["url"], None
+        except (httpx.HTTPStatusError, httpx.RequestError):
+            if not issues:
+                return None
+        
+        return issues[:max_issues]
     
     async def get_repository_tree(self, owner: str, repo: str, branch: str = "main") -> List[Dict]:
         """
         Get repository file tree.
         Try main/master branches.
+        HTTP errors give [], but RateLimitError propagates on purpose (see get_readme).
         """
         for branch_name in [branch, "main", "master"]:
             url = f"{self.BASE_URL}/repos/{owner}/{repo}/git/trees/{branch_name}?recursive=1"
             
-            async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-                try:
-                    response = await client.get(url, headers=self.headers)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    if 'tree' in data:
-                        return data['tree']
-                except (httpx.HTTPStatusError, httpx.RequestError):
-                    continue
+            client = self._get_client()
+            try:
+                response = await self._send(client, "GET", url, headers=self.headers)
+                response.raise_for_status()
+                data = response.json()
+                
+                if 'tree' in data:
+                    return data['tree']
+            except (httpx.HTTPStatusError, httpx.RequestError):
+                continue
         
         return []
\ No newline at end of file
@@ -3,16 +3,33 @@ Pytest configuration and fixtures.
 """
 import pytest
 import asyncio
+from pathlib import Path
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection, AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+)
+from sqlalchemy.pool import StaticPool
 from httpx import AsyncClient
 
 from main import app
-from db.database import Base
+from db.database import Base, get_db_rw, get_db_ro, get_conn_ro
+from routes import api
 
 
-# Test database URL
-TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+# The production database file (DATABASE_URL is relative to the working directory)
+PRODUCTION_DB_FILE = Path("app.db")
+
+# Modules that open sessions themselves rather than through a dependency
+SESSION_MAKER_TARGETS = (
+    "routes.api.async_session_maker",
+    "services.analysis_service.async_session_maker",
+    "services.analysis_service.read_session_maker",
+)
+
+
+# Test database URL: one in-memory database for the whole session
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 
 @pytest.fixture(scope="session")
@@ -23,33 +40,102 @@ def event_loop():
     loop.close()
 
 
-@pytest.fixture(scope="function")
-async def test_db() -> AsyncGenerator[AsyncSession, None]:
-    """Create test database session."""
-    engine = create_async_engine(TEST_DATABASE_URL, echo=False)
-    
-    # Create tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+@pytest.fixture(scope="session")
+async def test_engine() -> AsyncGenerator[AsyncEngine, None]:
+    """Create the test database engine and tables once per session."""
+    # StaticPool: every checkout shares the single connection, without
+    # which each connection would see its own empty in-memory database
+    engine = create_async_engine(
+        TEST_DATABASE_URL,
+        echo=False,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
     
-    # Create session
-    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    # The driver's implicit transactions ignore SAVEPOINT rollbacks; let
+    # SQLAlchemy emit BEGIN itself (SQLAlchemy's pysqlite savepoint recipe)
+    @event.listens_for(engine.sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
     
-    async with async_session() as session:
-        yield session
+    @event.listens_for(engine.sync_engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
     
-    # Cleanup
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    
+    yield engine
     
     await engine.dispose()
 
 
+@pytest.fixture(scope="function")
+async def test_db(test_engine: AsyncEngine) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Create test database session.
+    Everything the test writes, commits included, is rolled back afterwards:
+    the session works inside an outer transaction, and its own commits only
+    release savepoints.
+    """
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
+        
+        async with AsyncSession(
+            bind=conn,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint"
+        ) as session:
+            yield session
+        
+        await transaction.rollback()
+
+
 @pytest.fixture
-async def client() -> AsyncGenerator[AsyncClient, None]:
-    """Create test client."""
-    async with AsyncClient(app=app, base_url="http://test") as ac:
-        yield ac
+async def client(test_engine: AsyncEngine, monkeypatch) -> AsyncGenerator[AsyncClient, None]:
+    """
+    Create test client.
+    Every database dependency and session maker of the app is bound to
+    test_engine, so API tests never open the production database.
+    """
+    db_file_existed = PRODUCTION_DB_FILE.exists()
+    session_maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    
+    async def get_test_db() -> AsyncGenerator[AsyncSession, None]:
+        async with session_maker() as session:
+            yield session
+    
+    async def get_test_conn() -> AsyncGenerator[AsyncConnection, None]:
+        async with test_engine.connect() as conn:
+            yield conn
+    
+    async def skip_analysis_job(repo_id: str) -> None:
+        """
+        Stands in for the background analysis. A real job cancelled
+        mid-query would invalidate the single StaticPool connection, and
+        with it the in-memory database.
+        """
+    
+    for target in SESSION_MAKER_TARGETS:
+        monkeypatch.setattr(target, session_maker)
+    monkeypatch.setattr(api, "run_analysis_job", skip_analysis_job)
+    app.dependency_overrides.update({
+        get_db_rw: get_test_db,
+        get_db_ro: get_test_db,
+        get_conn_ro: get_test_conn
+    })
+    
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            yield ac
+        
+        # Scheduled (no-op) jobs finish before the patches are undone
+        await asyncio.gather(*api._analysis_tasks)
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert db_file_existed or not PRODUCTION_DB_FILE.exists(), \
+        "an API test opened the production database"
 
 
 @pytest.fixture
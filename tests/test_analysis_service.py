@@ -0,0 +1,167 @@
+"""
+Tests for the analysis service.
+"""
+import pytest
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.schemas import Repository, AnalysisSession
+from services.analysis_service import AnalysisServiceFinal
+from services.cache_service import CacheService
+from services.gemini_service import RepositoryAnalysis, GeminiAnswerError, FALLBACK_CONFIDENCE
+
+
+def _analysis(fields: dict, **overrides) -> RepositoryAnalysis:
+    """A RepositoryAnalysis from the mock fields, with a summary long enough to validate."""
+    return RepositoryAnalysis(**{**fields, "summary": "Test repository. " * 15, **overrides})
+
+
+class TestExecuteAnalysis:
+    """Test the background analysis job."""
+    
+    @staticmethod
+    async def _service_and_repo(mocker, test_db: AsyncSession, analysis: RepositoryAnalysis):
+        """A service with GitHub and Gemini mocked, and a queued repository."""
+        service = AnalysisServiceFinal()
+        service.cache = CacheService()
+        
+        mocker.patch.object(service.github, "get_repo_metadata", mocker.AsyncMock(
+            return_value={"language": "Python", "pushed_at": "2024-01-15T00:00:00Z"}
+        ))
+        mocker.patch.object(service.github, "get_repository_tree", mocker.AsyncMock(
+            return_value=[{"path": "main.py", "type": "blob", "sha": "sha-main", "size": 10}]
+        ))
+        mocker.patch.object(service.github, "get_issues", mocker.AsyncMock(return_value=[]))
+        mocker.patch.object(service, "_fetch_readme_and_files", mocker.AsyncMock(
+            return_value=("# Readme", {"main.py": "print(1)"})
+        ))
+        mocker.patch.object(
+            service.gemini, "analyze_repository", mocker.AsyncMock(return_value=analysis)
+        )
+        
+        repo_id = "a" * 32
+        test_db.add(Repository(
+            id=repo_id,
+            repo_url="https://github.com/owner/fingerprint-repo",
+            owner="owner",
+            name="fingerprint-repo"
+        ))
+        await test_db.flush()
+        test_db.add(AnalysisSession(
+            id="b" * 32, repo_id=repo_id, status="queued", started_at=datetime.utcnow()
+        ))
+        await test_db.commit()
+        return service, repo_id
+    
+    async def test_unchanged_repository_is_not_reanalyzed(self, mocker, test_db, mock_gemini_analysis):
+        """Test that a second run over unchanged content skips Gemini."""
+        analysis = _analysis(mock_gemini_analysis)
+        service, repo_id = await self._service_and_repo(mocker, test_db, analysis)
+        
+        await service.execute_analysis(repo_id, test_db)
+        await service.execute_analysis(repo_id, test_db)
+        
+        assert service.gemini.analyze_repository.call_count == 1
+        assert (await service.get_status(repo_id, test_db))["status"] == "completed"
+    
+    async def test_fallback_analysis_is_not_pinned(self, mocker, test_db, mock_gemini_analysis):
+        """Test that unchanged content is analyzed again after a fallback result."""
+        fallback = _analysis(mock_gemini_analysis, confidence_score=FALLBACK_CONFIDENCE)
+        service, repo_id = await self._service_and_repo(mocker, test_db, fallback)
+        
+        await service.execute_analysis(repo_id, test_db)
+        repo = await test_db.get(Repository, repo_id)
+        assert repo.content_fingerprint is None
+        
+        await service.execute_analysis(repo_id, test_db)
+        
+        assert service.gemini.analyze_repository.call_count == 2
+
+
+class TestAnswers:
+    """Test answering questions about an analyzed repository."""
+    
+    @staticmethod
+    def _service(
+        mocker, analysis: RepositoryAnalysis, *texts: str, fail: bool = True
+    ) -> AnalysisServiceFinal:
+        """
+        A service whose Gemini stream yields texts and then fails (or just
+        ends), for an unanswered question about analysis.
+        """
+        service = AnalysisServiceFinal()
+        service.cache = CacheService()
+        service.gemini.client = mocker.MagicMock()
+        service.gemini.model_name = "test-model"
+        
+        async def stream_text(prompt):
+            for text in texts:
+                yield text
+            if fail:
+                raise RuntimeError("connection reset")
+        
+        mocker.patch.object(service.gemini, "_stream_text", stream_text)
+        mocker.patch.object(service, "_find_answer", mocker.AsyncMock(return_value=None))
+        mocker.patch.object(service, "_get_analysis_model", mocker.AsyncMock(return_value=analysis))
+        mocker.patch.object(service, "_record_answer", mocker.AsyncMock())
+        mocker.patch("services.analysis_service.read_session_maker")
+        return service
+    
+    async def test_fallback_answer_is_not_recorded(self, mocker, mock_gemini_analysis):
+        """Test that fallback answers are served but never stored for reuse."""
+        analysis = _analysis(mock_gemini_analysis)
+        service = self._service(mocker, analysis)
+        fallback = service.gemini.fallback_answer("What is it?", analysis)
+        
+        deltas = [delta async for delta in service.stream_answer("r" * 32, "What is it?")]
+        result = await service.answer_question("r" * 32, "What is it?", mocker.MagicMock())
+        
+        assert deltas == [fallback]
+        assert result["answer"] == fallback
+        service._record_answer.assert_not_called()
+    
+    async def test_empty_answer_is_not_recorded(self, mocker, mock_gemini_analysis):
+        """Test that a stream ending without any text is answered by the fallback."""
+        analysis = _analysis(mock_gemini_analysis)
+        service = self._service(mocker, analysis, fail=False)
+        fallback = service.gemini.fallback_answer("What is it?", analysis)
+        
+        deltas = [delta async for delta in service.stream_answer("r" * 32, "What is it?")]
+        result = await service.answer_question("r" * 32, "What is it?", mocker.MagicMock())
+        
+        assert deltas == [fallback]
+        assert result["answer"] == fallback
+        service._record_answer.assert_not_called()
+    
+    async def test_interrupted_stream_is_not_recorded(self, mocker, mock_gemini_analysis):
+        """Test that a stream cut off midway raises instead of passing as an answer."""
+        service = self._service(mocker, _analysis(mock_gemini_analysis), "The project ")
+        
+        deltas = []
+        with pytest.raises(GeminiAnswerError):
+            async for delta in service.stream_answer("r" * 32, "What is it?"):
+                deltas.append(delta)
+        
+        assert deltas == ["The project "]
+        service._record_answer.assert_not_called()
+    
+    async def test_interrupted_answer_falls_back(self, mocker, mock_gemini_analysis):
+        """Test that /ask answers with the fallback, not the truncated text."""
+        analysis = _analysis(mock_gemini_analysis)
+        service = self._service(mocker, analysis, "The project ")
+        
+        result = await service.answer_question("r" * 32, "What is it?", mocker.MagicMock())
+        
+        assert result["answer"] == service.gemini.fallback_answer("What is it?", analysis)
+        service._record_answer.assert_not_called()
+    
+    async def test_blank_answer_is_not_recorded(self, mocker):
+        """Test that _record_answer never stores a blank answer for reuse."""
+        service = AnalysisServiceFinal()
+        service.cache = CacheService()
+        session_maker = mocker.patch("services.analysis_service.async_session_maker")
+        
+        await service._record_answer("r" * 32, "What is it?", b"hash", "  \n", "qa-key")
+        
+        session_maker.assert_not_called()
+        assert await service.cache.get("qa-key") is None
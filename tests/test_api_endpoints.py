@@ -16,6 +16,12 @@ class TestAPIEndpoints:
         data = response.json()
         assert data["status"] == "healthy"
     
+    async def test_pool_health(self, client: AsyncClient):
+        """Test connection pool status endpoint."""
+        response = await client.get("/api/pool-health")
+        assert response.status_code == 200
+        assert "Pool size" in response.json()["pool"]["read"]
+    
     async def test_root_endpoint(self, client: AsyncClient):
         """Test root endpoint."""
         response = await client.get("/")
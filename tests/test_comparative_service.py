@@ -0,0 +1,33 @@
+"""
+Tests for comparative analysis service.
+"""
+from models.schemas import Repository
+from services.cache_service import CacheService
+from services.comparative_service import ComparativeAnalysisService
+
+
+class TestComparativeAnalysisService:
+    """Test repository comparison."""
+    
+    async def test_compare_all_without_summaries(self, test_db):
+        """Test that "all" still compares repositories whose analysis has no summary yet."""
+        service = ComparativeAnalysisService()
+        service.cache = CacheService()
+        
+        repo_ids = ["c" * 32, "d" * 32]
+        for repo_id, name in zip(repo_ids, ["queued-repo", "failed-repo"]):
+            test_db.add(Repository(
+                id=repo_id,
+                repo_url=f"https://github.com/owner/{name}",
+                owner="owner",
+                name=name
+            ))
+        await test_db.flush()
+        
+        result = await service.compare_repositories(repo_ids, test_db, "all")
+        
+        assert result["repositories"] == ["owner/queued-repo", "owner/failed-repo"]
+        assert result["tech_stack"]["common_technologies"] == []
+        assert result["architecture"]["architectures"] == {}
+        assert result["complexity"]["ranking"] == []
+        assert result["complexity"]["summary"] == "Not enough analyzed repositories"
@@ -1,8 +1,9 @@
 """
 Tests for GitHub service.
 """
+import asyncio
 import pytest
-from services.github_service import GitHubService
+from services.github_service import GitHubService, RateLimitError
 
 
 class TestGitHubService:
@@ -69,3 +70,171 @@ class TestGitHubService:
         
         # HTTP client should only be called once
         assert mock_client.get.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_get_repo_metadata_concurrent_misses_share_fetch(self, mocker):
+        """Test that concurrent misses for one repository make a single request."""
+        service = GitHubService()
+        
+        mock_response = mocker.MagicMock(status_code=200, headers={})
+        mock_response.json.return_value = {"name": "shared-repo"}
+        
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return mock_response
+        
+        mock_client = mocker.MagicMock()
+        mock_client.get = mocker.AsyncMock(side_effect=slow_get)
+        mocker.patch("httpx.AsyncClient", return_value=mock_client)
+        
+        results = await asyncio.gather(
+            *(service.get_repo_metadata("owner", "shared-repo") for _ in range(3))
+        )
+        
+        assert [r["name"] for r in results] == ["shared-repo"] * 3
+        assert mock_client.get.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_get_file_contents_batch_single_request(self, mocker):
+        """Test that several files are fetched with one GraphQL request."""
+        service = GitHubService()
+        service.token = "token"
+        
+        mock_response = mocker.MagicMock()
+        mock_response.json.return_value = {
+            "data": {"repository": {"f0": {"text": "print(1)"}, "f1": None}}
+        }
+        mock_response.raise_for_status = mocker.MagicMock()
+        
+        mock_client = mocker.MagicMock()
+        mock_client.post = mocker.AsyncMock(return_value=mock_response)
+        mock_client.__aenter__ = mocker.AsyncMock(return_value=mock_client)
+        mock_client.__aexit__ = mocker.AsyncMock()
+        
+        mocker.patch("httpx.AsyncClient", return_value=mock_client)
+        
+        result = await service.get_file_contents_batch("owner", "repo", ["main.py", "missing.py"])
+        
+        assert result == {"main.py": "print(1)", "missing.py": None}
+        assert mock_client.post.call_count == 1
+        variables = mock_client.post.call_args.kwargs["json"]["variables"]
+        assert variables["e0"] == "HEAD:main.py"
+    
+    @pytest.mark.asyncio
+    async def test_get_file_contents_batch_without_token(self):
+        """Test that the batch is unavailable without a token."""
+        service = GitHubService()
+        service.token = None
+        
+        assert await service.get_file_contents_batch("owner", "repo", ["main.py"]) is None
+    
+    @pytest.mark.asyncio
+    async def test_get_readme_and_files_batch_single_request(self, mocker):
+        """Test that the README rides along with the files in one GraphQL request."""
+        service = GitHubService()
+        service.token = "token"
+        
+        mock_response = mocker.MagicMock()
+        mock_response.json.return_value = {
+            "data": {"repository": {"f0": {"text": "print(1)"}, "f1": {"text": "# Docs"}}}
+        }
+        mock_response.raise_for_status = mocker.MagicMock()
+        
+        mock_client = mocker.MagicMock()
+        mock_client.post = mocker.AsyncMock(return_value=mock_response)
+        mocker.patch("httpx.AsyncClient", return_value=mock_client)
+        
+        tree = [
+            {"path": "docs/README.md", "type": "blob", "sha": "sha-docs"},
+            {"path": "README.rst", "type": "blob", "sha": "sha-rst"},
+            {"path": "README.md", "type": "blob", "sha": "sha-md"},
+            {"path": "main.py", "type": "blob", "sha": "sha-main"}
+        ]
+        result = await service.get_readme_and_files_batch("owner", "batch-repo", tree, ["main.py"])
+        
+        assert result == ("# Docs", {"main.py": "print(1)"})
+        assert mock_client.post.call_count == 1
+        variables = mock_client.post.call_args.kwargs["json"]["variables"]
+        assert variables["e1"] == "HEAD:README.md"
+        
+        # Unchanged README blobs: served from the cache, not requested again
+        await service.get_readme_and_files_batch("owner", "batch-repo", tree, ["main.py"])
+        variables = mock_client.post.call_args.kwargs["json"]["variables"]
+        assert "e1" not in variables
+    
+    @pytest.mark.asyncio
+    async def test_rate_limited_request_is_retried(self, mocker):
+        """Test that a 429 with Retry-After is retried."""
+        service = GitHubService()
+        
+        limited = mocker.MagicMock(status_code=429, headers={"Retry-After": "0"})
+        ok = mocker.MagicMock(status_code=200, headers={
+            "X-RateLimit-Remaining": "4999", "X-RateLimit-Reset": "0"
+        })
+        client = mocker.MagicMock()
+        client.get = mocker.AsyncMock(side_effect=[limited, ok])
+        
+        response = await service._send(client, "GET", "https://api.github.com/x")
+        
+        assert response is ok
+        assert client.get.call_count == 2
+        assert service._rate_limits["core"] == (4999, 0.0)
+    
+    @pytest.mark.asyncio
+    async def test_rate_limited_retry_after_http_date(self, mocker):
+        """Test that an HTTP-date Retry-After is honoured instead of failing to parse."""
+        service = GitHubService()
+        sleep = mocker.patch("services.github_service.asyncio.sleep", mocker.AsyncMock())
+        
+        limited = mocker.MagicMock(status_code=429, headers={
+            "Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"
+        })
+        ok = mocker.MagicMock(status_code=200, headers={})
+        client = mocker.MagicMock()
+        client.get = mocker.AsyncMock(side_effect=[limited, ok])
+        
+        response = await service._send(client, "GET", "https://api.github.com/x")
+        
+        # A date in the past: retried right away
+        assert response is ok
+        sleep.assert_awaited_once_with(0.0)
+    
+    @pytest.mark.asyncio
+    async def test_rate_limit_too_long_to_wait_raises(self, mocker):
+        """Test that a far-off reset raises RateLimitError instead of sleeping."""
+        service = GitHubService()
+        
+        limited = mocker.MagicMock(status_code=403, headers={
+            "Retry-After": "3600", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "2000000000"
+        })
+        client = mocker.MagicMock()
+        client.get = mocker.AsyncMock(return_value=limited)
+        
+        with pytest.raises(RateLimitError, match="rate limit exceeded") as exc_info:
+            await service._send(client, "GET", "https://api.github.com/x")
+        
+        assert exc_info.value.reset_at == 2000000000.0
+        assert client.get.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_get_readme_cached_by_blob_sha(self, mocker):
+        """Test that the README is cached under its blob sha from the tree."""
+        service = GitHubService()
+        
+        listing = mocker.MagicMock(status_code=200, headers={})
+        listing.json.return_value = {"download_url": "https://raw.example/README.md"}
+        content = mocker.MagicMock(status_code=200, headers={}, text="# Readme")
+        
+        mock_client = mocker.MagicMock()
+        mock_client.get = mocker.AsyncMock(side_effect=[listing, content, listing, content])
+        mocker.patch("httpx.AsyncClient", return_value=mock_client)
+        
+        tree = [{"path": "README.md", "type": "blob", "sha": "sha-readme-1"}]
+        assert await service.get_readme("owner", "readme-repo", tree=tree) == "# Readme"
+        assert await service.get_readme("owner", "readme-repo", tree=tree) == "# Readme"
+        assert mock_client.get.call_count == 2
+        
+        # A new blob sha means new content: fetched again
+        tree[0]["sha"] = "sha-readme-2"
+        await service.get_readme("owner", "readme-repo", tree=tree)
+        assert mock_client.get.call_count == 4
@@ -2,8 +2,10 @@
 File filtering utilities for selecting important repository files.
 Filters by language, ignores build artifacts, and prioritizes entry points.
 """
-import os
-from typing import List, Dict, Set
+import heapq
+import re
+from functools import lru_cache
+from typing import Iterator, List, Dict, Optional, Set, Tuple
 
 
 class FileFilter:
@@ -28,84 +30,119 @@ class FileFilter:
     }
     
     # Configuration file extensions
-    CONFIG_EXTENSIONS = {
+    CONFIG_EXTENSIONS = frozenset({
         '.json', '.yml', '.yaml', '.toml', '.ini', '.cfg', '.conf', '.xml'
-    }
+    })
     
     # Common config file names
-    CONFIG_FILES = {
+    CONFIG_FILES = frozenset({
         'package.json', 'requirements.txt', 'setup.py', 'setup.cfg', 'pyproject.toml',
         'pom.xml', 'build.gradle', 'Makefile', 'CMakeLists.txt', 'Dockerfile',
         '.gitignore', '.dockerignore', 'tsconfig.json', 'webpack.config.js',
         'babel.config.js', '.eslintrc', '.prettierrc'
-    }
+    })
     
     # Directories to ignore
-    IGNORE_DIRS = {
+    IGNORE_DIRS = frozenset({
         'node_modules', 'venv', 'env', '.env', 'virtualenv', '__pycache__',
         'build', 'dist', 'target', 'bin', 'obj', '.git', '.svn', '.hg',
         'vendor', 'packages', '.idea', '.vscode', 'coverage', '.nyc_output',
         'out', 'tmp', 'temp', '.cache', '.pytest_cache', '.mypy_cache',
         'bower_components', 'jspm_packages'
-    }
+    })
     
     # Binary/generated file patterns
-    IGNORE_PATTERNS = {
+    IGNORE_PATTERNS = frozenset({
         '.pyc', '.pyo', '.so', '.dll', '.exe', '.o', '.a', '.lib',
         '.jar', '.war', '.ear', '.class', '.min.js', '.bundle.js',
         '.map', '.lock', '.log', '.swp', '.swo', '.DS_Store',
         '.png', '.jpg', '.jpeg', '.gif', '.ico', '.svg', '.pdf',
         '.zip', '.tar', '.gz', '.rar', '.7z'
-    }
+    })
     
     # Entry point file names (high priority)
-    ENTRY_POINTS = {
+    ENTRY_POINTS = frozenset({
         'main.py', 'app.py', '__main__.py', 'server.py', 'index.py',
         'main.js', 'index.js', 'app.js', 'server.js',
         'Main.java', 'Application.java',
         'main.c', 'main.cpp'
-    }
+    })
+    
+    # Base priority by role; other source files rank by their top-level directory
+    _ROLE_PRIORITY = {'entry_point': 100, 'configuration': 80}
+    _MAIN_DIRS = frozenset({'src', 'lib', 'app'})
+    
+    # Precompiled from the (frozen) sets above: an ignored (or hidden) directory
+    # anywhere in a path, and ignored name suffixes, multi-dot ones included
+    _IGNORE_DIR_RE = re.compile(
+        '(?:^|/)(?:' + '|'.join(map(re.escape, sorted(IGNORE_DIRS))) + r'|\.[^/]*)/'
+    )
+    _IGNORE_SUFFIXES = tuple(pattern.lower() for pattern in IGNORE_PATTERNS)
+    
+    @staticmethod
+    def _split_name(file_path: str) -> Tuple[str, str]:
+        """(basename, lowercased extension) with os.path semantics, minus the calls."""
+        filename = file_path.rpartition('/')[2]
+        # Leading dots do not start an extension (".gitignore" has none)
+        stem = filename.lstrip('.')
+        dot = stem.rfind('.')
+        return filename, stem[dot:].lower() if dot >= 0 else ''
     
     @classmethod
-    def should_ignore_file(cls, file_path: str) -> bool:
-        """Determine if a file should be ignored."""
-        # Check if in ignored directory
-        path_parts = file_path.split('/')
-        for part in path_parts[:-1]:  # Exclude filename itself
-            if part in cls.IGNORE_DIRS or part.startswith('.'):
-                return True
-        
-        # Check file extension
-        _, ext = os.path.splitext(file_path)
-        if ext.lower() in cls.IGNORE_PATTERNS:
-            return True
+    @lru_cache(maxsize=65536)
+    def classify(cls, file_path: str) -> Optional[Tuple[str, str]]:
+        """
+        (language, role) of a file, or None if it should be ignored.
+        Does the work of should_ignore_file, get_file_language and
+        get_file_role in one pass over the path. Memoized, since the same
+        paths come back on every re-analysis of a repository; clear with
+        FileFilter.classify.cache_clear() after changing the tables.
+        """
+        filename, ext = cls._split_name(file_path)
         
-        # Check if it's a hidden file
-        filename = os.path.basename(file_path)
-        if filename.startswith('.') and filename not in cls.CONFIG_FILES:
-            return True
+        if (
+            cls._IGNORE_DIR_RE.search(file_path)
+            or filename.lower().endswith(cls._IGNORE_SUFFIXES)
+            or (filename.startswith('.') and filename not in cls.CONFIG_FILES)
+        ):
+            return None
         
-        return False
+        language = cls.SUPPORTED_EXTENSIONS.get(ext, 'Unknown')
+        if filename in cls.ENTRY_POINTS:
+            role = "entry_point"
+        elif filename in cls.CONFIG_FILES or ext in cls.CONFIG_EXTENSIONS:
+            role = "configuration"
+        elif language != 'Unknown':
+            role = "source_code"
+        else:
+            role = "other"
+        return language, role
+    
+    @classmethod
+    def should_ignore_file(cls, file_path: str) -> bool:
+        """Determine if a file should be ignored."""
+        return cls.classify(file_path) is None
+    
+    @classmethod
+    def should_ignore_dir(cls, name: str) -> bool:
+        """Determine if everything under a directory (by its name) should be ignored."""
+        return name in cls.IGNORE_DIRS or name.startswith('.')
     
     @classmethod
     def get_file_language(cls, file_path: str) -> str:
         """Determine programming language from file extension."""
-        _, ext = os.path.splitext(file_path)
-        return cls.SUPPORTED_EXTENSIONS.get(ext.lower(), 'Unknown')
+        return cls.SUPPORTED_EXTENSIONS.get(cls._split_name(file_path)[1], 'Unknown')
     
     @classmethod
     def is_config_file(cls, file_path: str) -> bool:
         """Check if file is a configuration file."""
-        filename = os.path.basename(file_path)
-        _, ext = os.path.splitext(file_path)
-        
-        return filename in cls.CONFIG_FILES or ext.lower() in cls.CONFIG_EXTENSIONS
+        filename, ext = cls._split_name(file_path)
+        return filename in cls.CONFIG_FILES or ext in cls.CONFIG_EXTENSIONS
     
     @classmethod
     def is_entry_point(cls, file_path: str) -> bool:
         """Check if file is likely an entry point."""
-        filename = os.path.basename(file_path)
-        return filename in cls.ENTRY_POINTS
+        return cls._split_name(file_path)[0] in cls.ENTRY_POINTS
     
     @classmethod
     def get_file_role(cls, file_path: str) -> str:
@@ -125,63 +162,73 @@ class FileFilter:
         Filter and prioritize important files from repository tree.
         Returns up to max_files most important files.
         """
-        important_files = []
+        # Only the max_files best candidates are ever held, not every file
+        # of the tree; ties keep tree order, as a stable sort would
+        top_files = heapq.nsmallest(
+            max_files, cls._candidate_files(files), key=lambda x: -x['priority']
+        )
         
+        # Limit total size to avoid fetching too much content
+        selected_files = []
+        total_size = 0
+        max_total_size = 1_000_000  # 1MB total
+        
+        for file in top_files:
+            if total_size + file['size'] > max_total_size:
+                break
+            selected_files.append(file)
+            total_size += file['size']
+        
+        return selected_files
+    
+    @classmethod
+    def _candidate_files(cls, files: List[Dict]) -> Iterator[Dict]:
+        """
+        Yield each source or config file of the tree with its priority.
+        A recursive tree lists each directory's contents right after it, so
+        everything under an ignored directory is skipped on a prefix test
+        alone; classify still rejects such paths wherever they appear.
+        """
+        skipped_prefix = None
         for file in files:
-            if file.get('type') != 'blob':  # Only process files, not directories
+            path = file.get('path', '')
+            if skipped_prefix and path.startswith(skipped_prefix):
                 continue
             
-            path = file.get('path', '')
+            if file.get('type') == 'tree':
+                if cls.should_ignore_dir(path.rpartition('/')[2]):
+                    skipped_prefix = path + '/'
+                continue
+            if file.get('type') != 'blob':  # Only process files, not directories
+                continue
             
             # Skip ignored files
-            if cls.should_ignore_file(path):
+            classified = cls.classify(path)
+            if classified is None:
                 continue
             
             # Check if it's a supported file type or config
-            language = cls.get_file_language(path)
-            role = cls.get_file_role(path)
+            language, role = classified
             
             if language != 'Unknown' or role == 'configuration':
-                # Assign priority score
-                priority = 0
+                depth = path.count('/')
                 
-                # Entry points get highest priority
-                if cls.is_entry_point(path):
-                    priority = 100
-                # Config files get high priority
-                elif cls.is_config_file(path):
-                    priority = 80
-                # Source files in root or main directories
-                elif '/' not in path or path.split('/')[0] in ['src', 'lib', 'app']:
-                    priority = 60
-                # Other source files
-                else:
-                    priority = 40
+                # Assign priority score: entry points and config files by role
+                priority = cls._ROLE_PRIORITY.get(role)
+                if priority is None:
+                    # Source files in root or main directories, then the rest
+                    if depth == 0 or path.partition('/')[0] in cls._MAIN_DIRS:
+                        priority = 60
+                    else:
+                        priority = 40
                 
                 # Prefer shorter paths (likely more important)
-                depth = path.count('/')
                 priority -= depth * 5
                 
-                important_files.append({
+                yield {
                     'path': path,
                     'language': language,
                     'role': role,
                     'priority': priority,
                     'size': file.get('size', 0)
-                })
-        
-        # Sort by priority (descending) and limit
-        important_files.sort(key=lambda x: x['priority'], reverse=True)
-        
-        # Limit total size to avoid fetching too much content
-        selected_files = []
-        total_size = 0
-        max_total_size = 1_000_000  # 1MB total
-        
-        for file in important_files[:max_files]:
-            if total_size + file['size'] > max_total_size:
-                break
-            selected_files.append(file)
-            total_size += file['size']
-        
-        return selected_files
\ No newline at end of file
+                }
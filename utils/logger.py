@@ -4,11 +4,22 @@ Provides consistent, JSON-formatted logs for production monitoring.
 """
 import logging
 import sys
+import traceback
+from functools import lru_cache
 from typing import Any, Dict
-import json
+import orjson
 from datetime import datetime
 
 
+# Level names used by StructuredLogger -> logging levels
+_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR
+}
+
+
 class StructuredLogger:
     """Structured logger that outputs JSON-formatted logs."""
     
@@ -26,21 +37,20 @@ class StructuredLogger:
     
     def _log(self, level: str, message: str, **kwargs: Any):
         """Internal logging method."""
+        level_no = _LEVELS[level]
+        # Nothing is built for a level that is filtered out
+        if not self.logger.isEnabledFor(level_no):
+            return
+        
         log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # orjson writes a naive datetime exactly as isoformat() would
+            "timestamp": datetime.utcnow(),
             "level": level,
             "message": message,
             **kwargs
         }
-        
-        if level == "INFO":
-            self.logger.info(json.dumps(log_data))
-        elif level == "WARNING":
-            self.logger.warning(json.dumps(log_data))
-        elif level == "ERROR":
-            self.logger.error(json.dumps(log_data))
-        elif level == "DEBUG":
-            self.logger.debug(json.dumps(log_data))
+        # Serialized by StructuredFormatter, only for handlers that emit it
+        self.logger.log(level_no, message, extra={"structured": log_data})
     
     def info(self, message: str, **kwargs: Any):
         """Log info message."""
@@ -54,6 +64,12 @@ class StructuredLogger:
         """Log error message."""
         self._log("ERROR", message, **kwargs)
     
+    def exception(self, message: str, **kwargs: Any):
+        """Log error message with the traceback of the exception being handled."""
+        # The traceback is only formatted when ERROR is enabled
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log("ERROR", message, traceback=traceback.format_exc(), **kwargs)
+    
     def debug(self, message: str, **kwargs: Any):
         """Log debug message."""
         self._log("DEBUG", message, **kwargs)
@@ -64,12 +80,17 @@ class StructuredFormatter(logging.Formatter):
     
     def format(self, record: logging.LogRecord) -> str:
         """Format log record as JSON."""
-        return record.getMessage()
+        data = getattr(record, "structured", None)
+        if data is None:
+            return record.getMessage()
+        return orjson.dumps(data).decode()
 
 
+@lru_cache(maxsize=None)
 def get_logger(name: str) -> StructuredLogger:
     """
     Get a structured logger instance.
+    One instance per name is created and shared, so its handler is set up once.
     
     Args:
         name: Logger name (typically __name__)
@@ -6,16 +6,21 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi import Request
+from functools import lru_cache
 import os
 
 
-# Initialize rate limiter
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=[f"{os.getenv('RATE_LIMIT_PER_MINUTE', '10')}/minute"]
-)
-
-
+@lru_cache(maxsize=None)
 def get_limiter():
-    """Get the rate limiter instance."""
-    return limiter
+    """
+    Get the rate limiter instance.
+    Built on first use (after .env is loaded) and shared by every caller.
+    Counters live in RATE_LIMIT_STORAGE_URI (e.g. redis://host:6379) so that
+    every worker shares them; the in-process default is per worker.
+    """
+    return Limiter(
+        key_func=get_remote_address,
+        default_limits=[f"{os.getenv('RATE_LIMIT_PER_MINUTE', '10')}/minute"],
+        storage_uri=os.getenv("RATE_LIMIT_STORAGE_URI", "memory://"),
+        strategy="moving-window"
+    )